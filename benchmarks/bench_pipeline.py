@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Offline benchmark of the build-and-publish pipeline on synthetic services.
+
+    python benchmarks/bench_pipeline.py --scale small --output result.json
+    python benchmarks/bench_pipeline.py --compare baseline.json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import optparse
+import subprocess
+from os.path import join, dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from builder import BuilderManager, copytree
+from builder.registry import save_services
+from builder.utils import get_version
+from tests.helpers import make_setting
+
+SCALES = {
+    'small': {'services': [1, 10], 'files': [1000]},
+    'medium': {'services': [1, 10, 100], 'files': [1000, 20000]},
+    'full': {'services': [1, 10, 100, 500], 'files': [1000, 20000, 200000]},
+}
+
+GENERATOR = '''import os, sys
+count, size, depth, out = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+payload = (b"<p>docbuilder benchmark</p>\\n" * (size // 28 + 1))[:size]
+for i in range(count):
+    parts = ["d{}".format((i >> (4 * level)) % 16) for level in range(depth)]
+    path = os.path.join(out, *parts)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "page{}.html".format(i)), "wb") as f:
+        f.write(payload)
+'''
+
+MAKEFILE = '''FILES ?= 100
+SIZE ?= 1024
+DEPTH ?= 3
+html:
+\t{python} gen.py $(FILES) $(SIZE) $(DEPTH) _build/html
+'''
+
+GIT = ["git", "-c", "user.name=DocBuilder Bench", "-c", "user.email=bench@example.com"]
+
+
+def make_remote(root: str, name: str):
+    work_dir = join(root, 'work', name)
+    remote = join(root, 'remotes', name + '.git')
+    os.makedirs(work_dir)
+    with open(join(work_dir, 'gen.py'), 'w') as f:
+        f.write(GENERATOR)
+    with open(join(work_dir, 'Makefile'), 'w') as f:
+        f.write(MAKEFILE.format(python=sys.executable))
+    for args in [["init", "-q"], ["add", "-A"], ["commit", "-q", "-m", "bench"],
+                 ["clone", "-q", "--bare", work_dir, remote]]:
+        subprocess.run(GIT + args, cwd=work_dir, check=True, stdout=subprocess.DEVNULL)
+    return remote
+
+
+def make_manager(root: str, services: dict, **settings):
+    setting = make_setting(root)
+    for key, value in settings.items():
+        setting[key] = value
+    save_services(setting['DATABASE_FILE'], services)
+    return BuilderManager(setting)
+
+
+def succeeded(result):
+    # build_service/publish_service return False and batchrun_all a summary on failure; init raises
+    if isinstance(result, dict):
+        return all(summary['success'] for summary in result.values())
+    return result is not False
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    if not succeeded(result):
+        raise RuntimeError("{} failed, timing is not valid".format(func.__name__))
+    return seconds
+
+
+def bench_services(count: int, repeat: int):
+    results = []
+    root = tempfile.mkdtemp(prefix='docbuilder-bench-')
+    try:
+        remote = make_remote(root, 'template')
+        services = {"svc{:04d}".format(i): {"source": remote, "build": ["make html FILES=10"],
+                                             "publish": "./_build/html"} for i in range(count)}
+        manager = make_manager(root, services, SYNC_JOBS=8, JOBS=8)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            manager.get_services_list()
+        results.append(('get_services_list', (time.perf_counter() - start) / repeat))
+        results.append(('init', timed(manager.init)))
+        results.append(('batchrun_all', timed(manager.batchrun_all)))
+        results.append(('batchrun_all_unchanged', timed(manager.batchrun_all)))
+    finally:
+        shutil.rmtree(root)
+    return [{'name': name, 'services': count, 'files': 10, 'file_size': None, 'depth': None,
+             'seconds': seconds} for name, seconds in results]
+
+
+def bench_files(count: int, size: int, depth: int):
+    results = []
+    root = tempfile.mkdtemp(prefix='docbuilder-bench-')
+    try:
+        remote = make_remote(root, 'site')
+        services = {"site": {"source": remote, "build": ["make html FILES={} SIZE={} DEPTH={}".format(
+            count, size, depth)], "publish": "./_build/html"}}
+        manager = make_manager(root, services)
+        timed(manager.init)
+        results.append(('build_service', timed(manager.build_service, 'site', True)))
+        source = manager.get_publish_source('site')
+        results.append(('copytree', timed(copytree, source, join(root, 'copytree'))))
+        results.append(('publish_copy', timed(manager.publish_service, 'site')))
+        manager.setting['PUBLISH_MODE'] = 'delta'
+        shutil.rmtree(join(root, 'share', 'site'))
+        os.makedirs(join(root, 'share', 'site'))
+        results.append(('publish_delta_initial', timed(manager.publish_service, 'site')))
+        results.append(('publish_delta_unchanged', timed(manager.publish_service, 'site')))
+        manager.setting['PUBLISH_MODE'] = 'release'
+        results.append(('publish_release_initial', timed(manager.publish_service, 'site')))
+        results.append(('publish_release_unchanged', timed(manager.publish_service, 'site')))
+    finally:
+        shutil.rmtree(root)
+    return [{'name': name, 'services': 1, 'files': count, 'file_size': size, 'depth': depth,
+             'seconds': seconds} for name, seconds in results]
+
+
+def run(scale: dict, size: int, depth: int, repeat: int):
+    results = []
+    for count in scale['services']:
+        print("services={}".format(count), file=sys.stderr)
+        results.extend(bench_services(count, repeat))
+    for count in scale['files']:
+        print("files={}".format(count), file=sys.stderr)
+        results.extend(bench_files(count, size, depth))
+    return {'version': get_version(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.time(), 'results': results}
+
+
+def result_key(result: dict):
+    return result['name'], result['services'], result['files'], result.get('file_size'), result.get('depth')
+
+
+def compare(baseline_file: str, current_file: str, threshold: float):
+    with open(baseline_file, 'r', encoding="utf-8") as f:
+        baseline = {result_key(result): result for result in json.load(f)['results']}
+    with open(current_file, 'r', encoding="utf-8") as f:
+        current = json.load(f)['results']
+    regressions = 0
+    for result in current:
+        old = baseline.get(result_key(result))
+        if not old or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        print("{:<26} services={:<5} files={:<7} size={!s:<6} depth={!s:<2} {:>9.4f}s -> {:>9.4f}s {:>6.2f}x {}".format(
+            result['name'], result['services'], result['files'], result.get('file_size'), result.get('depth'),
+            old['seconds'], result['seconds'], ratio, flag))
+    return regressions == 0
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="usage: %prog [options]")
+    parser.add_option("--scale", default='small', help="benchmark scale: {}".format(', '.join(SCALES)))
+    parser.add_option("--services", metavar="N,N", help="override service counts")
+    parser.add_option("--files", metavar="N,N", help="override file counts")
+    parser.add_option("--file-size", type="int", default=4096, dest="file_size", help="bytes per generated file")
+    parser.add_option("--depth", type="int", default=3, help="directory depth of generated files")
+    parser.add_option("--repeat", type="int", default=100, help="repetitions of fast operations")
+    parser.add_option("--output", metavar="FILE", help="write JSON results to FILE instead of stdout")
+    parser.add_option("--compare", action="store_true",
+                      help="compare two result files: BASELINE CURRENT")
+    parser.add_option("--threshold", type="float", default=0.2,
+                      help="relative slowdown reported as regression by --compare")
+    options, args = parser.parse_args(argv)
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error("--compare takes BASELINE CURRENT")
+        return 0 if compare(args[0], args[1], options.threshold) else 1
+
+    if options.scale not in SCALES:
+        parser.error("unknown scale {}".format(options.scale))
+    scale = dict(SCALES[options.scale])
+    if options.services:
+        scale['services'] = [int(count) for count in options.services.split(',')]
+    if options.files:
+        scale['files'] = [int(count) for count in options.files.split(',')]
+    report = json.dumps(run(scale, options.file_size, options.depth, options.repeat), indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,14 +4,35 @@
 import os
 import json
 from os.path import join, abspath, dirname, exists, isfile, splitext, basename
-from shutil import move, copy2, copystat
+from shutil import move, copy2, rmtree
 import datetime
+import time
 import filecmp
 import subprocess
 import logging
 import platform
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from .minisetting import Setting
-from .utils import config_logging
+from .utils import config_logging, log_context
+from .manifest import Manifest, delta_copytree
+from .fastcopy import fast_copytree
+from .partial import changed_files, select_partial
+from .registry import ServiceRegistry, save_services
+from .state import BuildState, git_head, recipe_hash
+from .sync import sync_repository, update_mirror
+from .scheduler import run_daemon, spread_cron
+from .runner import BuildLog, run_command
+from .stats import History, rusage_fields, summarize
+from .graph import dependency_map, invalid_services, run_graph, with_dependents
+from .trigger import TriggerQueue, TriggerServer
+from .compress import compress_tree
+from .search import SearchIndex
+from .cache import BuildCache, expand_env
+from .jobserver import JobServer, limit_command
+from .lock import ServiceLock
+from .release import new_release_id, create_release, adopt_live_dir, activate_release, prune_releases, \
+    current_release, previous_release
 
 
 def is_sub_directory(base_dir, test_dir):
@@ -21,27 +42,22 @@ def is_sub_directory(base_dir, test_dir):
     return os.path.commonprefix([test_dir, base_dir]) == base_dir
 
 
-def copytree(src, dst, ignore=None):
-    names = os.listdir(src)
-    if ignore is not None:
-        ignored_names = ignore(src, names)
-    else:
-        ignored_names = set()
+def copytree(src, dst, ignore=None, jobs=None):
+    return fast_copytree(src, dst, ignore, jobs)['bytes']
 
-    if not os.path.exists(dst):
-        os.makedirs(dst)
 
-    for name in names:
-        if name in ignored_names:
-            continue
-
-        src_name = os.path.join(src, name)
-        dst_name = os.path.join(dst, name)
+def copy_outputs(src, dst, outputs):
+    copied_bytes = 0
+    for output in outputs:
+        src_name = join(src, output)
+        dst_name = join(dst, output)
         if os.path.isdir(src_name):
-            copytree(src_name, dst_name, ignore)
-        else:
+            copied_bytes += copytree(src_name, dst_name)
+        elif exists(src_name):
+            os.makedirs(dirname(dst_name), exist_ok=True)
             copy2(src_name, dst_name)
-    copystat(src, dst)
+            copied_bytes += os.path.getsize(dst_name)
+    return copied_bytes
 
 
 class BuilderManager:
@@ -49,95 +65,307 @@ class BuilderManager:
         self.setting = Setting() if not setting else setting
         config_logging(self.setting)
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.registry = ServiceRegistry(self.setting['DATABASE_FILE'])
+        self.build_state = BuildState(join(self.setting['STATE_DIR'], 'build_state.json'))
+        self.cache_hits = set()
+        self.partial_outputs = {}
+        self.history = History(self.setting['HISTORY_FILE'] or join(self.setting['STATE_DIR'], 'history.jsonl'),
+                               self.setting['HISTORY_ENABLED'])
+        self.build_cache = BuildCache(self.setting['CACHE_DIR'], self.setting['CACHE_MAX_BYTES'])
+        self.search_index = SearchIndex(self.setting['SEARCH_INDEX'] or join(self.setting['STATE_DIR'], 'search.db'))
+        self.jobserver = JobServer(self.setting['JOBSERVER_SLOTS']) if self.setting['MAKE_JOBSERVER'] else None
 
     def get_services_list(self):
-        build_services = []
-        publish_services = []
-        if exists(self.setting['DATABASE_FILE']):
-            with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-                services = json.load(f)
-            for service_name, service in services.items():
-                if 'build' in service:
-                    build_services.append(service_name)
-                if 'publish' in service:
-                    publish_services.append(service_name)
-        else:
+        if not self.registry.exists():
             self.logger.error("Database file not exists!")
-        return build_services, publish_services
+        return self.registry.build_services(), self.registry.publish_services()
+
+    def get_publish_source(self, service_name: str):
+        original_path = self.registry.get(service_name)['publish']
+        if not os.path.isabs(original_path):
+            original_path = join(self.setting['DATA_DIR'], service_name, original_path)
+        return original_path
 
-    def build_service(self, service_name: str):
+    def _timed(self, service_name: str, phase: str, func, *args):
+        with log_context(service_name, phase):
+            start = time.monotonic()
+            success = func(*args)
+            duration = time.monotonic() - start
+            self.logger.info("{} <{}> {} in {:.1f}s".format(phase, service_name, "done" if success else "failed",
+                                                            duration), extra={'duration': duration})
+            return success
+
+    def build_service(self, service_name: str, force=False):
+        return self._timed(service_name, 'build', self._build_service, service_name, force)
+
+    def _build_service(self, service_name: str, force=False):
         self.logger.info("build service <{}>".format(service_name))
-        build_services, publish_services = self.get_services_list()
-        if service_name not in build_services:
+        self.cache_hits.discard(service_name)
+        self.partial_outputs.pop(service_name, None)
+        if not self.registry.is_build_service(service_name):
             self.logger.error('<{}> not available in Build service'.format(service_name))
             return False
-        with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-            services = json.load(f)
-        build_cmds = services[service_name]['build']
-        current_dir = os.getcwd()
+        service = self.registry.get(service_name)
+        build_cmds = service['build']
         project_dir = join(self.setting['DATA_DIR'], service_name)
-        if exists(project_dir):
-            os.chdir(project_dir)
-        else:
+        if not exists(project_dir):
             self.logger.error("project {} not exists".format(service_name))
             return False
+        head = git_head(project_dir)
+        recipe = recipe_hash(build_cmds, service.get('env'), self._upstream_builds(service))
+        output_exists = not self.registry.is_publish_service(service_name) or \
+            exists(self.get_publish_source(service_name))
+        last_build = self.build_state.get(service_name)
+        if not force and head and output_exists and last_build and \
+                last_build['head'] == head and last_build['recipe'] == recipe:
+            self.logger.info("build <{}> skipped: source {} and recipe unchanged (cache hit)".format(
+                service_name, head[:12]))
+            self.cache_hits.add(service_name)
+            return True
+        partial = None
+        # after a re-clone or a clean the outputs of unselected targets would be missing, and after a failed
+        # publish they never reached PUBLISH_DIR, so a partial build needs the last build fully published
+        # and the outputs of every mapped target in place
+        if not force and 'partial' in service and head and output_exists and last_build and \
+                last_build['recipe'] == recipe and self._published(service_name, last_build) and \
+                self._partial_outputs_exist(service_name, service['partial']):
+            changed = changed_files(project_dir, last_build['head'], head)
+            partial = select_partial(service['partial'], changed) if changed is not None else None
+        if partial is not None:
+            build_cmds = [cmd for cmd in build_cmds if not cmd.startswith("make") or cmd in partial[0]]
+            self.logger.info("partial build <{}>: {}".format(service_name, ", ".join(partial[0])))
+        with self.build_cache.use(service_name) as cache_dir:
+            env = dict(os.environ, DOCBUILDER_CACHE_DIR=cache_dir)
+            env.update(expand_env(service.get('env', {}), cache_dir))
+            success = self._run_build_commands(service_name, project_dir, build_cmds, env)
+        if success:
+            self.build_state.set(service_name, {'head': head, 'recipe': recipe, 'time': time.time()})
+            if partial is not None and partial[1] is not None:
+                self.partial_outputs[service_name] = partial[1]
+            return True
+        # the outputs may be half written, the next build must not be a cache hit
+        self.build_state.clear(service_name)
+        return False
+
+    def _published(self, service_name: str, last_build: dict):
+        return not self.registry.is_publish_service(service_name) or last_build.get('published') == last_build['head']
+
+    def _partial_outputs_exist(self, service_name: str, partial: dict):
+        if not self.registry.is_publish_service(service_name):
+            return True
+        original_path = self.get_publish_source(service_name)
+        return all(exists(join(original_path, output))
+                   for rule in partial.values() for output in rule.get('publish', []))
+
+    def _upstream_builds(self, service: dict):
+        upstreams = {}
+        for upstream in service.get('depends_on', []):
+            record = self.build_state.get(upstream)
+            if record:
+                upstreams[upstream] = [record['head'], record['time']]
+        return upstreams
+
+    def _build_log_path(self, service_name: str):
+        build_log_dir = self.setting['BUILD_LOG_DIR'] or join(self.setting['LOG_DIR'], 'build')
+        return join(build_log_dir, service_name + '.log')
+
+    def _run_build_commands(self, service_name: str, project_dir: str, build_cmds: list, env=None):
+        service_timeout = self.setting['SERVICE_TIMEOUT']
+        deadline = time.monotonic() + service_timeout if service_timeout else None
+        cwd = project_dir
         cmd_results = True
-        for cmd in build_cmds:
-            if not cmd.startswith(("make", "cd", "cp")):
-                self.logger.error("wrong build command {}".format(cmd))
-                cmd_results = False
-                break
-            else:
-                if cmd.startswith('cd'):
-                    path = cmd.strip()[3:]
-                    if not os.path.isabs(path):
-                        path = join(project_dir, path)
-                    if not is_sub_directory(project_dir, path):
-                        self.logger.error("Build Failed: <cd> out of project scope")
-                        cmd_results = False
-                        break
-                    os.chdir(path)
+        limits = self.registry.get(service_name).get('limits', {})
+        limits = (limits.get('cpu', self.setting['BUILD_CPU_LIMIT']),
+                  limits.get('memory', self.setting['BUILD_MEMORY_LIMIT']),
+                  limits.get('nice', self.setting['BUILD_NICE']))
+        with BuildLog(self._build_log_path(service_name), self.setting['BUILD_LOG_MAX_BYTES'],
+                      self.setting['BUILD_LOG_BACKUP_COUNT'], self.setting['BUILD_LOG_TAIL_LINES']) as build_log:
+            build_log.write_header("build service <{}>".format(service_name))
+            for cmd in build_cmds:
+                if not cmd.startswith(("make", "cd", "cp")):
+                    self.logger.error("wrong build command {}".format(cmd))
+                    cmd_results = False
+                    break
                 else:
-                    cmd = cmd.strip().split()
-                    ret = subprocess.run(cmd, stdout=subprocess.PIPE)
-                    if ret.returncode != 0:
-                        self.logger.error("Build Failed: {}".format(ret.stdout))
-                        cmd_results = False
-                        break
-        os.chdir(current_dir)
+                    if cmd.startswith('cd'):
+                        path = cmd.strip()[3:]
+                        if not os.path.isabs(path):
+                            path = join(project_dir, path)
+                        if not is_sub_directory(project_dir, path):
+                            self.logger.error("Build Failed: <cd> out of project scope")
+                            cmd_results = False
+                            break
+                        cwd = path
+                    else:
+                        timeout = self.setting['BUILD_TIMEOUT']
+                        if deadline is not None:
+                            remaining = deadline - time.monotonic()
+                            timeout = remaining if timeout is None else min(timeout, remaining)
+                        ret = self._run_build_command(cmd, cwd, build_log, timeout, env, limits)
+                        self.history.record(service_name, 'build', cmd, ret.duration, ret.success,
+                                            **rusage_fields(ret.rusage))
+                        if ret.timed_out:
+                            self.logger.error("Build Failed: <{}> timed out after {:.1f}s\n{}".format(
+                                cmd, ret.duration, build_log.tail()))
+                            cmd_results = False
+                            break
+                        if ret.returncode != 0:
+                            self.logger.error("Build Failed: <{}> exited with {}\n{}".format(
+                                cmd, ret.returncode, build_log.tail()))
+                            cmd_results = False
+                            break
         return cmd_results
 
+    def _run_build_command(self, cmd, cwd, build_log, timeout, env, limits):
+        args = limit_command(cmd.strip().split(), *limits)
+        if self.jobserver is None or not cmd.startswith("make"):
+            return run_command(args, cwd, build_log, timeout, env)
+        env = dict(os.environ if env is None else env)
+        env['MAKEFLAGS'] = self.jobserver.makeflags(env.get('MAKEFLAGS', ''))
+        token = self.jobserver.acquire()
+        try:
+            return run_command(args, cwd, build_log, timeout, env, pass_fds=self.jobserver.fds)
+        finally:
+            self.jobserver.release(token)
+
     def publish_service(self, service_name: str):
+        return self._timed(service_name, 'publish', self._publish_service, service_name)
+
+    def _publish_service(self, service_name: str):
         self.logger.info("publish service <{}>".format(service_name))
-        build_services, publish_services = self.get_services_list()
-        if service_name not in publish_services:
+        if not self.registry.is_publish_service(service_name):
             self.logger.error('<{}> not available in Publish service'.format(service_name))
             return False
         publish_dir = join(self.setting['PUBLISH_DIR'], service_name)
         if not exists(publish_dir):
             self.logger.error("Publish dir not exist")
             return False
-        with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-            services = json.load(f)
-        original_path = services[service_name]['publish']
+        original_path = self.get_publish_source(service_name)
         project_dir = join(self.setting['DATA_DIR'], service_name)
-        if not os.path.isabs(original_path):
-            original_path = join(project_dir, original_path)
         if not is_sub_directory(project_dir, original_path):
             self.logger.error("Publish Failed: out of project scope")
             return False
-        copytree(original_path, publish_dir)
+        if self.setting['PUBLISH_MODE'] != 'release' and os.path.islink(publish_dir):
+            self.logger.error("Publish Failed: <{}> is published as releases, use release mode".format(service_name))
+            return False
+        outputs = self.partial_outputs.pop(service_name, None)
+        start = time.monotonic()
+        if self.setting['PUBLISH_MODE'] == 'release':
+            copied_bytes = self._publish_release(service_name, original_path, publish_dir)
+            if copied_bytes is None:
+                return False
+        elif self.setting['PUBLISH_MODE'] == 'delta':
+            manifest = Manifest(join(self.setting['STATE_DIR'], 'manifests', service_name + '.json'))
+            stats = delta_copytree(original_path, publish_dir, manifest, outputs=outputs)
+            self.logger.info("publish <{}>: {copied} copied ({copied_bytes} bytes), "
+                             "{skipped} skipped ({skipped_bytes} bytes), "
+                             "{deleted} deleted ({deleted_bytes} bytes)".format(service_name, **stats))
+            copied_bytes = stats['copied_bytes']
+        elif outputs is not None:
+            self.logger.info("publish <{}> outputs: {}".format(service_name, ", ".join(outputs)))
+            copied_bytes = copy_outputs(original_path, publish_dir, outputs)
+        else:
+            stats = fast_copytree(original_path, publish_dir, jobs=self.setting['COPY_JOBS'])
+            self.logger.info("publish <{}>: {files} files ({bytes} bytes) copied in {seconds:.2f}s, "
+                             "{rate:.1f} MB/s".format(service_name, rate=stats['bytes_per_sec'] / 1e6, **stats))
+            copied_bytes = stats['bytes']
+        self.history.record(service_name, 'publish', self.setting['PUBLISH_MODE'], time.monotonic() - start,
+                            bytes=copied_bytes)
+        if self.setting['COMPRESS_ENABLED']:
+            self._compress_publish(service_name, publish_dir)
+        if self.setting['SEARCH_ENABLED']:
+            self._index_publish(service_name, publish_dir)
+        last_build = self.build_state.get(service_name)
+        if last_build:
+            self.build_state.update(service_name, published=last_build['head'])
+        return True
+
+    def _index_publish(self, service_name: str, publish_dir: str):
+        start = time.monotonic()
+        try:
+            stats = self.search_index.update_service(service_name, publish_dir)
+        except sqlite3.Error:
+            self.logger.exception("search index update of <{}> failed".format(service_name))
+            return
+        self.logger.info("index <{}>: {indexed} indexed, {unchanged} unchanged, {removed} removed".format(
+            service_name, **stats))
+        self.history.record(service_name, 'publish', 'index', time.monotonic() - start)
+
+    def search(self, query: str, limit=20, service_name=None):
+        try:
+            return self.search_index.search(query, limit, service_name)
+        except sqlite3.Error as e:
+            self.logger.error("search failed: {}".format(e))
+            return []
+
+    def _compress_publish(self, service_name: str, publish_dir: str):
+        start = time.monotonic()
+        stats = compress_tree(publish_dir, self.setting['COMPRESS_EXTENSIONS'], self.setting['COMPRESS_MIN_SIZE'],
+                              self.setting['COMPRESS_LEVEL'], self.setting['COMPRESS_BROTLI'],
+                              self.setting['COMPRESS_JOBS'],
+                              join(self.setting['STATE_DIR'], 'compressed', service_name + '.json'))
+        self.logger.info("compress <{}>: {compressed} compressed ({bytes_in} -> {bytes_out} bytes), "
+                         "{skipped} unchanged, {removed} orphans removed".format(service_name, **stats))
+        self.history.record(service_name, 'publish', 'compress', time.monotonic() - start, bytes=stats['bytes_out'])
+
+    def _release_root(self, service_name: str):
+        # by default a sibling of PUBLISH_DIR: on the same filesystem for renames and hardlinks, but
+        # outside of the document root so retained releases are not served
+        publish_root = abspath(self.setting['PUBLISH_DIR']).rstrip(os.sep)
+        return join(self.setting['RELEASE_DIR'] or publish_root + '-releases', service_name)
+
+    def _publish_release(self, service_name: str, original_path: str, publish_dir: str):
+        release_root = self._release_root(service_name)
+        # the live directory is only touched once the new release is complete
+        previous_dir = os.path.realpath(publish_dir) if os.path.islink(publish_dir) else publish_dir
+        release_dir = join(release_root, new_release_id())
+        adopted_dir = None
+        try:
+            stats = create_release(original_path, release_dir, previous_dir)
+            adopted_dir = adopt_live_dir(publish_dir, release_root)
+            activate_release(publish_dir, release_dir)
+        except OSError:
+            self.logger.exception("Publish Failed: create release {} of <{}>".format(basename(release_dir),
+                                                                                     service_name))
+            if not os.path.lexists(publish_dir):
+                if adopted_dir is not None:
+                    os.rename(adopted_dir, publish_dir)
+                else:
+                    os.makedirs(publish_dir)
+            rmtree(release_dir, ignore_errors=True)
+            return None
+        removed = prune_releases(release_root, self.setting['RELEASE_KEEP'], current_release(publish_dir))
+        self.logger.info("publish <{}> release {}: {linked} linked ({linked_bytes} bytes), "
+                         "{copied} copied ({copied_bytes} bytes), {removed} old releases removed".format(
+                             service_name, basename(release_dir), removed=len(removed), **stats))
+        return stats['copied_bytes']
+
+    def rollback_service(self, service_name: str):
+        self.logger.info("rollback service <{}>".format(service_name))
+        if not self.registry.is_publish_service(service_name):
+            self.logger.error('<{}> not available in Publish service'.format(service_name))
+            return False
+        publish_dir = join(self.setting['PUBLISH_DIR'], service_name)
+        release_root = self._release_root(service_name)
+        current = current_release(publish_dir)
+        if current is None:
+            self.logger.error("Rollback Failed: <{}> is not published as releases".format(service_name))
+            return False
+        previous = previous_release(release_root, current)
+        if previous is None:
+            self.logger.error("Rollback Failed: no release before {}".format(current))
+            return False
+        activate_release(publish_dir, join(release_root, previous))
+        self.logger.info("<{}> rolled back from release {} to {}".format(service_name, current, previous))
         return True
 
     def get_service_config(self, service_name: str, output=''):
         self.logger.info("get service <{}> configuration".format(service_name))
-        with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-            services = json.load(f)
-        if service_name not in services:
+        config = self.registry.get(service_name)
+        if config is None:
             self.logger.error("service not found")
             return False
         else:
-            config = services[service_name]
             if output:
                 with open(output, 'w', encoding="utf-8") as f:
                     json.dump(config, f, indent=2, ensure_ascii=False)
@@ -145,6 +373,28 @@ class BuilderManager:
                 print(json.dumps(config, indent=2))
             return True
 
+    def export_database(self, output: str):
+        if not self.registry.exists():
+            self.logger.error("Database file not exists!")
+            return False
+        self.logger.info("export database to {}".format(output))
+        save_services(output, self.registry.services())
+        return True
+
+    def crontab_entries(self):
+        crontab = []
+        for service_name, service in self.registry.services().items():
+            if 'synchronization' in service and 'crontab' in service['synchronization'] and \
+                service['synchronization']['crontab']:
+                cron = service['synchronization']['crontab']
+                if self.setting['CRON_SPREAD']:
+                    cron = spread_cron(cron, service_name)
+                app = self.setting['CMD']
+                cron_log = join(self.setting['LOG_DIR'], service_name + '.log')
+                batchrun = '--batchrun --coalesce' if self.setting['LOCK_COALESCE'] else '--batchrun'
+                crontab.append('{} {} {} {} >> {} 2>&1\n'.format(cron, app, batchrun, service_name, cron_log))
+        return crontab
+
     def set_crontab(self):
         if platform.system() != 'Linux':
             self.logger.warning("Not Linux system, Crontab will not set!")
@@ -156,20 +406,10 @@ class BuilderManager:
         cron_header = 'SHELL=/bin/sh\n' \
                       'PATH=/usr/local/sbin:/usr/local/bin:/sbin:/bin:/usr/sbin:/usr/bin\n\n' \
                       '# m h dom mon dow user  command\n'
-        crontab = []
-        if exists(self.setting['DATABASE_FILE']):
-            with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-                services = json.load(f)
-            for service_name, service in services.items():
-                if 'synchronization' in service and 'crontab' in service['synchronization'] and \
-                    service['synchronization']['crontab']:
-                    cron = service['synchronization']['crontab']
-                    app = self.setting['CMD']
-                    cron_log = join(self.setting['LOG_DIR'], service_name + '.log')
-                    crontab.append('{} {} {} {} >> {} 2>&1\n'.format(cron, app, '--batchrun', service_name, cron_log))
-        else:
+        if not self.registry.exists():
             self.logger.error("Database file not exists!")
             return False
+        crontab = self.crontab_entries()
         
         if crontab:
             cron_path = self.setting['CRON_FILE']
@@ -187,31 +427,162 @@ class BuilderManager:
             self.logger.info("No cron job found!")
         return True
 
+    def daemon(self, jobs=None):
+        self.logger.info("start scheduler daemon")
+        run_daemon(self, jobs)
+        return True
+
+    def get_stats(self, service_name=None):
+        return summarize(self.history.records(service_name))
+
+    def serve(self, host=None, port=None, jobs=None):
+        queue = TriggerQueue(self.batchrun_service, jobs if jobs else self.setting['TRIGGER_JOBS'])
+        server = TriggerServer((host if host else self.setting['TRIGGER_HOST'],
+                                port if port is not None else self.setting['TRIGGER_PORT']), queue, self.registry)
+        self.logger.info("trigger server listening on {}:{}".format(*server.server_address[:2]))
+        queue.start()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            queue.stop()
+        return True
+
+    def clear_cache(self, service_name=None):
+        if service_name and self.registry.get(service_name) is None:
+            self.logger.error("<{}> is not a registered service".format(service_name))
+            return False
+        cleared = self.build_cache.clear(service_name)
+        self.logger.info("cleared build cache of {}".format(', '.join(cleared) if cleared else 'no service'))
+        return True
+
     def autoconf(self):
         self.set_crontab()
 
-    def batchrun_service(self, service_name: str):
-        build_services, publish_services = self.get_services_list()
-        if service_name in build_services:
-            self.build_service(service_name)
-        if service_name in publish_services:
-            self.publish_service(service_name)
+    def batchrun_service(self, service_name: str, force=False):
+        lock = ServiceLock(self.setting['LOCK_DIR'] or join(self.setting['STATE_DIR'], 'locks'), service_name)
+        if not lock.acquire():
+            if not self.setting['LOCK_COALESCE']:
+                self.logger.warning("<{}> is already running, skip this run".format(service_name))
+                return False
+            lock.request_rerun()
+            if not lock.acquire():
+                self.logger.info("<{}> is already running, rerun requested".format(service_name))
+                return True
+        while True:
+            try:
+                lock.take_rerun()
+                success = self._batchrun_service(service_name, force)
+                while lock.take_rerun():
+                    self.logger.info("rerun <{}> requested while running".format(service_name))
+                    success = self._batchrun_service(service_name, force)
+            finally:
+                lock.release()
+            # a rerun requested between the last check and the release is picked up here
+            if not lock.rerun_requested() or not lock.acquire():
+                return success
+
+    def _batchrun_service(self, service_name: str, force=False):
+        is_build = self.registry.is_build_service(service_name)
+        is_publish = self.registry.is_publish_service(service_name)
+        if not is_build and not is_publish:
+            self.logger.error('<{}> not available in Build or Publish service'.format(service_name))
+            return False
+        success = True
+        if is_build and self.setting['SYNC_BEFORE_BUILD']:
+            success = self.sync_service(service_name)
+        if success and is_build:
+            success = self.build_service(service_name, force)
+        if success and is_publish:
+            success = self.publish_service(service_name)
+        return success
+
+    def batchrun_all(self, service_names=None, jobs=None, force=False):
+        if not service_names:
+            build_services, publish_services = self.get_services_list()
+            service_names = build_services + [name for name in publish_services if name not in build_services]
+        jobs = jobs if jobs else self.setting['JOBS']
+        self.logger.info("batchrun {} services with {} jobs".format(len(service_names), jobs))
+
+        def run(service_name):
+            start = time.monotonic()
+            try:
+                success = self.batchrun_service(service_name, force)
+            except Exception:
+                self.logger.exception("batchrun <{}> raised".format(service_name))
+                success = False
+            return success, time.monotonic() - start
+
+        services = self.registry.services()
+        deps = dependency_map(services, strict=False)
+        invalid = invalid_services(services)
+        affected = with_dependents(deps, invalid) & set(service_names)
+        for service_name in sorted(affected):
+            self.logger.error("<{}> not run: {}".format(
+                service_name, invalid.get(service_name, "an upstream service has an invalid <depends_on>")))
+        summary = run_graph([name for name in service_names if name not in affected], deps, run, jobs)
+        for service_name in affected:
+            summary[service_name] = {'success': False, 'duration': 0.0, 'skipped': True}
+        for service_name, result in summary.items():
+            result['cached'] = service_name in self.cache_hits
+            if result['skipped'] and service_name not in affected:
+                self.logger.warning("<{}> skipped: an upstream service failed".format(service_name))
+        return {name: summary[name] for name in service_names}
+
+    def batchrun_cascade(self, service_name: str, jobs=None, force=False):
+        deps = dependency_map(self.registry.services(), strict=False)
+        if service_name not in deps:
+            self.logger.error('<{}> not available in Build or Publish service'.format(service_name))
+            return {service_name: {'success': False, 'duration': 0.0, 'skipped': True, 'cached': False}}
+        selected = with_dependents(deps, [service_name])
+        return self.batchrun_all([name for name in deps if name in selected], jobs, force)
+
+    def sync_service(self, service_name: str):
+        return self._timed(service_name, 'sync', self._sync_service, service_name)
+
+    def _sync_service(self, service_name: str):
+        self.logger.info("sync service <{}>".format(service_name))
+        if not self.registry.is_build_service(service_name):
+            self.logger.error('<{}> not available in Build service'.format(service_name))
+            return False
+        source = self.registry.get(service_name).get('source')
+        if not source:
+            self.logger.error("<{}> has no source".format(service_name))
+            return False
+        reference = None
+        if self.setting['GIT_MIRROR_DIR']:
+            reference = join(self.setting['GIT_MIRROR_DIR'], service_name + '.git')
+            start, usage = time.monotonic(), {}
+            success, output = update_mirror(source, reference, usage)
+            self.history.record(service_name, 'sync', 'mirror', time.monotonic() - start, success, **usage)
+            if not success:
+                self.logger.warning("update mirror of <{}> failed: {}".format(service_name, output))
+        start, usage = time.monotonic(), {}
+        success, output = sync_repository(source, join(self.setting['DATA_DIR'], service_name),
+                                          depth=self.setting['GIT_CLONE_DEPTH'],
+                                          filter_spec=self.setting['GIT_CLONE_FILTER'],
+                                          reference=reference, usage=usage)
+        self.history.record(service_name, 'sync', 'checkout', time.monotonic() - start, success, **usage)
+        if not success:
+            self.logger.error("sync <{}> failed: {}".format(service_name, output))
+        return success
+
+    def sync_services(self, service_names=None, jobs=None):
+        if not service_names:
+            service_names = self.registry.build_services()
+        jobs = jobs if jobs else self.setting['SYNC_JOBS']
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            results = list(executor.map(self.sync_service, service_names))
+        return dict(zip(service_names, results))
 
     def init(self):
         build_services, publish_services = self.get_services_list()
-        build_dir = self.setting['DATA_DIR']
         publish_dir = self.setting['PUBLISH_DIR']
-        with open(self.setting['DATABASE_FILE'], 'r', encoding="utf-8") as f:
-                services = json.load(f)
-        for service_name in build_services:
-            sub_dir = join(build_dir, service_name)
-            os.makedirs(sub_dir, exist_ok=True)
-            src = services[service_name]['source']
-            if not exists(join(sub_dir, '.git')):
-                ret = subprocess.run(["git", "clone", src, sub_dir], stdout=subprocess.DEVNULL)
-                if ret.returncode != 0:
-                    raise RuntimeError("Clone {} failed, please try render again".format(service_name))
+        for service_name, success in self.sync_services(build_services).items():
+            if not success:
+                raise RuntimeError("Clone {} failed, please try render again".format(service_name))
         for service_name in publish_services:
             sub_dir = join(publish_dir, service_name)
             os.makedirs(sub_dir, exist_ok=True)
-        
\ No newline at end of file
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import fcntl
+import threading
+from contextlib import contextmanager
+from os.path import join, exists, isdir, dirname, realpath
+from shutil import rmtree
+
+LAST_USED_MARKER = '.last_used'
+
+
+def tree_size(path: str):
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for name in file_names:
+            try:
+                total += os.lstat(join(dir_path, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def expand_env(env: dict, cache_dir: str):
+    return {key: str(value).replace('{cache}', cache_dir) for key, value in env.items()}
+
+
+class BuildCache:
+    # one directory per service outside the checkout, evicted least recently used first. A build
+    # holds a shared flock on <root>/<service>.lock, which eviction in any process must win first.
+    def __init__(self, root: str, max_bytes=0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_use = set()
+
+    def service_dir(self, service_name: str):
+        return join(self.root, service_name)
+
+    def is_service_dir(self, service_name: str):
+        # refuses names like "..", "/" or "a/b" which resolve outside of the cache root
+        return bool(service_name) and dirname(realpath(self.service_dir(service_name))) == realpath(self.root)
+
+    def _lock_file(self, service_name: str):
+        os.makedirs(self.root, exist_ok=True)
+        return open(join(self.root, service_name + '.lock'), 'a')
+
+    @contextmanager
+    def use(self, service_name: str):
+        cache_dir = self.service_dir(service_name)
+        with self._lock:
+            self._in_use.add(service_name)
+        lock_file = self._lock_file(service_name)
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            with self._lock:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(join(cache_dir, LAST_USED_MARKER), 'a'):
+                    pass
+                os.utime(join(cache_dir, LAST_USED_MARKER))
+            yield cache_dir
+        finally:
+            lock_file.close()
+            with self._lock:
+                self._in_use.discard(service_name)
+            self.evict()
+
+    def _remove(self, service_name: str):
+        # only removes a cache no process is building with
+        with self._lock_file(service_name) as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            rmtree(self.service_dir(service_name), ignore_errors=True)
+            return True
+
+    def usage(self):
+        entries = []
+        if not exists(self.root):
+            return entries
+        for name in sorted(os.listdir(self.root)):
+            cache_dir = join(self.root, name)
+            if not isdir(cache_dir):
+                continue
+            marker = join(cache_dir, LAST_USED_MARKER)
+            last_used = os.stat(marker).st_mtime if exists(marker) else 0
+            entries.append((name, tree_size(cache_dir), last_used))
+        return entries
+
+    def evict(self):
+        removed = []
+        if not self.max_bytes:
+            return removed
+        with self._lock:
+            entries = self.usage()
+            total = sum(size for _, size, _ in entries)
+            for name, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                if total <= self.max_bytes:
+                    break
+                if name in self._in_use or not self._remove(name):
+                    continue
+                total -= size
+                removed.append(name)
+        return removed
+
+    def clear(self, service_name=None):
+        with self._lock:
+            names = [service_name] if service_name else \
+                [name for name in (os.listdir(self.root) if exists(self.root) else [])]
+            cleared = []
+            for name in names:
+                if name in self._in_use or not self.is_service_dir(name) or not isdir(self.service_dir(name)):
+                    continue
+                if self._remove(name):
+                    cleared.append(name)
+            return cleared
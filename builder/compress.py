@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import gzip
+import multiprocessing
+from os.path import join, exists, splitext, relpath, dirname
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+
+def _compress_file(task):
+    path, suffixes, level = task
+    with open(path, 'rb') as f:
+        data = f.read()
+    st = os.stat(path)
+    written = 0
+    for suffix in suffixes:
+        if suffix == '.gz':
+            compressed = gzip.compress(data, compresslevel=level, mtime=0)
+        else:
+            compressed = brotli.compress(data, quality=min(level, 11))
+        target = path + suffix
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        # the compressed copy carries the source mtime so unchanged sources are skipped next time
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp_path, target)
+        written += len(compressed)
+    return len(data), written
+
+
+def _add_results(stats, results):
+    for bytes_in, bytes_out in results:
+        stats['compressed'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+
+
+def load_tracked(state_file):
+    if state_file is None or not exists(state_file):
+        return set()
+    with open(state_file, 'r', encoding="utf-8") as f:
+        return set(json.load(f))
+
+
+def save_tracked(state_file, tracked):
+    if state_file is None:
+        return
+    os.makedirs(dirname(state_file), exist_ok=True)
+    tmp_path = state_file + '.tmp'
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(sorted(tracked), f)
+    os.replace(tmp_path, state_file)
+
+
+def compress_tree(root: str, extensions, min_size=1024, level=9, use_brotli=False, jobs=None, state_file=None):
+    """Write ``.gz`` (and ``.br``) siblings of compressible files under ``root`` and remove orphaned ones.
+
+    Only compressed files written by this function, as recorded in ``state_file``, are ever replaced or
+    removed; ``.gz``/``.br`` files shipped by the build itself are left alone."""
+    suffixes = ['.gz'] + (['.br'] if use_brotli and brotli is not None else [])
+    extensions = tuple(extensions)
+    stats = {'compressed': 0, 'skipped': 0, 'removed': 0, 'bytes_in': 0, 'bytes_out': 0}
+    tracked = load_tracked(state_file)
+    owned = set()
+    tasks = []
+
+    def remove_tracked(path):
+        if relpath(path, root) in tracked and exists(path):
+            os.remove(path)
+            stats['removed'] += 1
+
+    for dir_path, _, file_names in os.walk(root):
+        names = set(file_names)
+        for name in file_names:
+            path = join(dir_path, name)
+            base, suffix = splitext(name)
+            if suffix in COMPRESSED_SUFFIXES and base.endswith(extensions):
+                if base not in names or suffix not in suffixes:
+                    remove_tracked(path)
+                continue
+            if not name.endswith(extensions):
+                continue
+            st = os.stat(path)
+            if st.st_size < min_size:
+                for compressed_suffix in COMPRESSED_SUFFIXES:
+                    remove_tracked(path + compressed_suffix)
+                continue
+            stale = []
+            for compressed_suffix in suffixes:
+                rel_name = relpath(path + compressed_suffix, root)
+                try:
+                    mtime_ns = os.stat(path + compressed_suffix).st_mtime_ns
+                except FileNotFoundError:
+                    stale.append(compressed_suffix)
+                    continue
+                # our copies carry the source mtime, anything else untracked came with the build
+                if mtime_ns == st.st_mtime_ns:
+                    owned.add(rel_name)
+                elif rel_name in tracked:
+                    stale.append(compressed_suffix)
+            if stale:
+                tasks.append((path, stale, level))
+                owned.update(relpath(path + compressed_suffix, root) for compressed_suffix in stale)
+            else:
+                stats['skipped'] += 1
+    save_tracked(state_file, owned)
+
+    jobs = jobs if jobs else os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2 * jobs:
+        _add_results(stats, map(_compress_file, tasks))
+        return stats
+    # spawn instead of fork: publish may run inside a multi-threaded batchrun
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+        _add_results(stats, executor.map(_compress_file, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    return stats
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import time
+from os.path import join
+from shutil import copyfileobj, copystat
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl number of FICLONE from linux/fs.h
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _kernel_copy(copy, fsrc: int, fdst: int, size: int):
+    copied = 0
+    while copied < size:
+        sent = copy(fsrc, fdst, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _copy_file_range(fsrc, fdst, count):
+    return os.copy_file_range(fsrc, fdst, min(count, CHUNK_SIZE))
+
+
+def _sendfile(fsrc, fdst, count):
+    return os.sendfile(fdst, fsrc, None, min(count, CHUNK_SIZE))
+
+
+def _copy_data(fsrc, fdst, size: int, methods: dict):
+    # a method failing on the first file fails the same way for the rest of the tree,
+    # so it is turned off instead of being retried for every file
+    if methods['reflink']:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            methods['reflink'] = False
+    for name, copy in (('copy_file_range', _copy_file_range), ('sendfile', _sendfile)):
+        if not methods[name]:
+            continue
+        try:
+            if _kernel_copy(copy, fsrc.fileno(), fdst.fileno(), size):
+                return
+        except OSError:
+            if os.lseek(fdst.fileno(), 0, os.SEEK_CUR) != 0:
+                raise
+        methods[name] = False
+    copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+
+def copy_file(src: str, dst: str, methods: dict):
+    with open(src, 'rb') as fsrc:
+        st = os.fstat(fsrc.fileno())
+        with open(dst, 'wb') as fdst:
+            if st.st_size:
+                _copy_data(fsrc, fdst, st.st_size, methods)
+            os.chmod(fdst.fileno(), stat.S_IMODE(st.st_mode))
+            os.utime(fdst.fileno(), ns=(st.st_atime_ns, st.st_mtime_ns))
+    return st.st_size
+
+
+def copy_methods():
+    return {'reflink': fcntl is not None and hasattr(fcntl, 'ioctl'),
+            'copy_file_range': hasattr(os, 'copy_file_range'),
+            'sendfile': hasattr(os, 'sendfile')}
+
+
+def fast_copytree(src, dst, ignore=None, jobs=None):
+    """Copy ``src`` into ``dst`` like ``copytree``, scanning with ``os.scandir`` and copying files in a
+    thread pool. Directory metadata is applied once all files are in place."""
+    start = time.monotonic()
+    methods = copy_methods()
+    stats = {'files': 0, 'bytes': 0}
+    dirs = []
+    pending = set()
+    jobs = jobs if jobs else min(32, (os.cpu_count() or 1) + 4)
+
+    def collect(done):
+        for future in done:
+            stats['bytes'] += future.result()
+            stats['files'] += 1
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        stack = [(src, dst)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            with os.scandir(src_dir) as it:
+                entries = list(it)
+            ignored_names = ignore(src_dir, [entry.name for entry in entries]) if ignore is not None else set()
+            os.makedirs(dst_dir, exist_ok=True)
+            dirs.append((src_dir, dst_dir))
+            for entry in entries:
+                if entry.name in ignored_names:
+                    continue
+                if entry.is_dir():
+                    stack.append((entry.path, join(dst_dir, entry.name)))
+                    continue
+                pending.add(executor.submit(copy_file, entry.path, join(dst_dir, entry.name), methods))
+                if len(pending) >= jobs * 64:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+        collect(wait(pending)[0])
+    for src_dir, dst_dir in reversed(dirs):
+        copystat(src_dir, dst_dir)
+    stats['seconds'] = time.monotonic() - start
+    stats['bytes_per_sec'] = stats['bytes'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return stats
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class DependencyError(ValueError):
+    pass
+
+
+def dependency_map(services: dict, strict=True):
+    # with strict=False unknown upstream services are dropped instead of raising
+    deps = {}
+    for service_name, service in services.items():
+        for upstream in service.get('depends_on', []):
+            if upstream not in services and strict:
+                raise DependencyError("<{}> depends on unknown service <{}>".format(service_name, upstream))
+        deps[service_name] = [upstream for upstream in service.get('depends_on', []) if upstream in services]
+    return deps
+
+
+def invalid_services(services: dict):
+    """Return ``{service name: reason}`` for services with an unknown upstream or inside a dependency cycle."""
+    invalid = {}
+    for service_name, service in services.items():
+        unknown = [upstream for upstream in service.get('depends_on', []) if upstream not in services]
+        if unknown:
+            invalid[service_name] = "depends on unknown service <{}>".format('>, <'.join(unknown))
+    deps = dependency_map(services, strict=False)
+    ordered = set(_order(deps, list(deps)))
+    for service_name in deps:
+        if service_name not in ordered and service_name not in invalid:
+            invalid[service_name] = "part of or behind a dependency cycle"
+    return invalid
+
+
+def reverse_map(deps: dict):
+    dependents = {name: [] for name in deps}
+    for name, upstreams in deps.items():
+        for upstream in upstreams:
+            dependents.setdefault(upstream, []).append(name)
+    return dependents
+
+
+def _order(deps: dict, service_names: list):
+    selected = set(service_names)
+    waiting = {name: {upstream for upstream in deps.get(name, []) if upstream in selected} for name in service_names}
+    dependents = reverse_map(deps)
+    order = []
+    ready = [name for name in service_names if not waiting[name]]
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for child in dependents.get(name, []):
+            if child in waiting and name in waiting[child]:
+                waiting[child].discard(name)
+                if not waiting[child]:
+                    ready.append(child)
+    return order
+
+
+def topological_order(deps: dict, service_names=None):
+    service_names = list(deps) if service_names is None else list(service_names)
+    order = _order(deps, service_names)
+    if len(order) != len(service_names):
+        cycle = sorted(name for name in service_names if name not in order)
+        raise DependencyError("dependency cycle between {}".format(', '.join(cycle)))
+    return order
+
+
+def with_dependents(deps: dict, service_names):
+    dependents = reverse_map(deps)
+    closure = set()
+    stack = list(service_names)
+    while stack:
+        name = stack.pop()
+        if name in closure:
+            continue
+        closure.add(name)
+        stack.extend(dependents.get(name, []))
+    return closure
+
+
+def run_graph(service_names, deps: dict, run, jobs=1):
+    """Run ``run(name) -> (success, duration)`` so that a service starts only after its selected
+    upstream services succeeded; dependents of a failed service are skipped."""
+    service_names = topological_order(deps, service_names)
+    selected = set(service_names)
+    waiting = {name: {upstream for upstream in deps.get(name, []) if upstream in selected} for name in service_names}
+    dependents = reverse_map(deps)
+    results = {}
+    submitted = set()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {}
+
+        def submit_ready():
+            for name in service_names:
+                if name not in submitted and name not in results and not waiting[name]:
+                    submitted.add(name)
+                    futures[executor.submit(run, name)] = name
+
+        submit_ready()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                success, duration = future.result()
+                results[name] = {'success': success, 'duration': duration, 'skipped': False}
+                if success:
+                    for child in dependents.get(name, []):
+                        if child in waiting:
+                            waiting[child].discard(name)
+                    continue
+                for child in with_dependents(deps, [name]) - {name}:
+                    if child in selected and child not in results:
+                        results[child] = {'success': False, 'duration': 0.0, 'skipped': True}
+            submit_ready()
+    return results
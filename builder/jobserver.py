@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import fcntl
+import termios
+import array
+import select
+import threading
+
+
+class JobServer:
+    # a GNU make jobserver pipe shared by every make started by this process. The pool is per
+    # process: under cron every --batchrun process has its own, only --batchrun-all, --daemon
+    # and --serve share one pool between services.
+    def __init__(self, slots=None):
+        self.slots = max(1, slots if slots else os.cpu_count() or 1)
+        self.read_fd, self.write_fd = os.pipe()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._fill()
+
+    def _fill(self):
+        os.write(self.write_fd, b'+' * self.slots)
+
+    def _available(self):
+        count = array.array('i', [0])
+        fcntl.ioctl(self.read_fd, termios.FIONREAD, count)
+        return count[0]
+
+    def makeflags(self, makeflags=''):
+        return "{} -j --jobserver-auth={},{}".format(makeflags, self.read_fd, self.write_fd).strip()
+
+    @property
+    def fds(self):
+        return self.read_fd, self.write_fd
+
+    def acquire(self):
+        # a top-level make runs its first job on an implicit slot without asking the jobserver,
+        # so that slot is taken from the pool here before the make starts
+        with self._lock:
+            self._active += 1
+        # make switches the shared read end to non-blocking, so wait for a token with select
+        while True:
+            select.select([self.read_fd], [], [])
+            try:
+                return os.read(self.read_fd, 1)
+            except BlockingIOError:
+                continue
+
+    def release(self, token):
+        with self._lock:
+            self._active -= 1
+            os.write(self.write_fd, token)
+            # tokens held by a killed make are lost, top the pool up whenever no make is running
+            if self._active == 0:
+                missing = self.slots - self._available()
+                if missing > 0:
+                    os.write(self.write_fd, b'+' * missing)
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+def limit_command(cmd: list, cpu_seconds=None, memory_bytes=None, nice=None):
+    # limits are applied by wrapping the command with the shell ulimit builtin and nice, both of which
+    # BusyBox provides as well; a preexec_fn is not safe in a process running threads
+    limits = []
+    if cpu_seconds:
+        limits.append("ulimit -t {}".format(int(cpu_seconds)))
+    if memory_bytes:
+        limits.append("ulimit -v {}".format(max(int(memory_bytes) // 1024, 1)))
+    if limits:
+        cmd = ["sh", "-c", '{}; exec "$@"'.format("; ".join(limits)), "sh"] + cmd
+    if nice:
+        cmd = ["nice", "-n", str(int(nice))] + cmd
+    return cmd
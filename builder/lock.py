@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import fcntl
+from os.path import join, exists
+
+
+class ServiceLock:
+    # an flock held for the whole batchrun of a service; the lock file itself is never removed,
+    # since unlinking a file other processes may be waiting on breaks mutual exclusion
+    def __init__(self, lock_dir: str, service_name: str):
+        self.path = join(lock_dir, service_name + '.lock')
+        self.pending_path = join(lock_dir, service_name + '.pending')
+        self._file = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def request_rerun(self):
+        with open(self.pending_path, 'w'):
+            pass
+
+    def rerun_requested(self):
+        return exists(self.pending_path)
+
+    def take_rerun(self):
+        try:
+            os.remove(self.pending_path)
+        except FileNotFoundError:
+            return False
+        return True
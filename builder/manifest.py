@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from os.path import join, exists, dirname
+from shutil import copy2, copystat, rmtree
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    # entries: relative path -> [size, mtime_ns, sha256]
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if exists(path):
+            with open(path, 'r', encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def save(self):
+        os.makedirs(dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def walk_files(src, ignore=None, rel=''):
+    src_dir = join(src, rel) if rel else src
+    names = os.listdir(src_dir)
+    ignored_names = ignore(src_dir, names) if ignore is not None else set()
+    for name in sorted(names):
+        if name in ignored_names:
+            continue
+        rel_name = join(rel, name) if rel else name
+        if os.path.isdir(join(src, rel_name)):
+            yield from walk_files(src, ignore, rel_name)
+        else:
+            yield rel_name
+
+
+def _remove_empty_dirs(root, rel_dirs):
+    for rel_dir in sorted(rel_dirs, key=len, reverse=True):
+        path = join(root, rel_dir)
+        while rel_dir and exists(path) and not os.listdir(path):
+            os.rmdir(path)
+            rel_dir = dirname(rel_dir)
+            path = join(root, rel_dir)
+
+
+def is_output(name, outputs):
+    return any(name == output or name.startswith(output + os.sep) for output in outputs)
+
+
+def walk_outputs(src, outputs, ignore=None):
+    for output in outputs:
+        if os.path.isdir(join(src, output)):
+            yield from walk_files(src, ignore, output)
+        elif exists(join(src, output)):
+            yield output
+
+
+def _clear_path(dst, name):
+    # make room for a file at ``name``: a directory in its place or a file in place of a parent
+    # directory is left over from a path that changed type between publishes
+    dst_name = join(dst, name)
+    if os.path.isdir(dst_name) and not os.path.islink(dst_name):
+        rmtree(dst_name)
+    parts = name.split(os.sep)[:-1]
+    for i in range(1, len(parts) + 1):
+        path = join(dst, *parts[:i])
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.remove(path)
+            break
+
+
+def delta_copytree(src, dst, manifest: Manifest, ignore=None, outputs=None):
+    stats = {'copied': 0, 'skipped': 0, 'deleted': 0,
+             'copied_bytes': 0, 'skipped_bytes': 0, 'deleted_bytes': 0}
+    entries = {}
+    if outputs is None:
+        names = list(walk_files(src, ignore))
+    else:
+        # only files below outputs were rebuilt, keep the manifest of everything else as it is
+        entries = {name: old for name, old in manifest.entries.items() if not is_output(name, outputs)}
+        names = list(walk_outputs(src, outputs, ignore))
+    os.makedirs(dst, exist_ok=True)
+
+    # vanished files go first, a file may be replaced by a directory of the same name
+    current = set(names)
+    vanished_dirs = set()
+    for name, old in manifest.entries.items():
+        if name in current or name in entries:
+            continue
+        dst_name = join(dst, name)
+        if os.path.isfile(dst_name):
+            os.remove(dst_name)
+            stats['deleted'] += 1
+            stats['deleted_bytes'] += old[0]
+        vanished_dirs.add(dirname(name))
+    _remove_empty_dirs(dst, vanished_dirs)
+
+    for name in names:
+        src_name = join(src, name)
+        dst_name = join(dst, name)
+        st = os.stat(src_name)
+        old = manifest.get(name)
+        if old and old[0] == st.st_size and old[1] == st.st_mtime_ns and os.path.isfile(dst_name):
+            entries[name] = old
+            stats['skipped'] += 1
+            stats['skipped_bytes'] += st.st_size
+            continue
+        digest = file_digest(src_name)
+        entries[name] = [st.st_size, st.st_mtime_ns, digest]
+        if old and old[2] == digest and os.path.isfile(dst_name):
+            stats['skipped'] += 1
+            stats['skipped_bytes'] += st.st_size
+            continue
+        _clear_path(dst, name)
+        os.makedirs(dirname(dst_name), exist_ok=True)
+        copy2(src_name, dst_name)
+        stats['copied'] += 1
+        stats['copied_bytes'] += st.st_size
+    copystat(src, dst)
+
+    manifest.entries = entries
+    manifest.save()
+    return stats
@@ -14,10 +14,55 @@ class Setting:
             "LOG_LEVEL": 'DEBUG',
             "LOG_FILE": None,
             "LOG_DIR": join(dirname(dirname(abspath(__file__))), "log"),
+            "LOG_JSON": False,
+            "LOG_SERVICE_FILES": False,
+            "LOG_MAX_BYTES": 10 * 1024 * 1024,
+            "LOG_BACKUP_COUNT": 5,
             "DATABASE_FILE": join(dirname(dirname(abspath(__file__))), "database.json"),
             "PUBLISH_DIR": "/share",
             "DATA_DIR": '/docs',
-            "CRON_FILE": join(dirname(dirname(abspath(__file__))), "crontab")
+            "CRON_FILE": join(dirname(dirname(abspath(__file__))), "crontab"),
+            "CRON_SPREAD": False,
+            "STATE_DIR": join(dirname(dirname(abspath(__file__))), "state"),
+            "PUBLISH_MODE": 'copy',
+            "COPY_JOBS": None,
+            "JOBS": 1,
+            "SYNC_JOBS": 4,
+            "SYNC_BEFORE_BUILD": False,
+            "GIT_CLONE_DEPTH": None,
+            "GIT_CLONE_FILTER": None,
+            "GIT_MIRROR_DIR": None,
+            "DAEMON_JOBS": 2,
+            "BUILD_LOG_DIR": None,
+            "BUILD_LOG_MAX_BYTES": 10 * 1024 * 1024,
+            "BUILD_LOG_BACKUP_COUNT": 3,
+            "BUILD_LOG_TAIL_LINES": 50,
+            "BUILD_TIMEOUT": None,
+            "SERVICE_TIMEOUT": None,
+            "HISTORY_ENABLED": True,
+            "HISTORY_FILE": None,
+            "RELEASE_DIR": None,
+            "RELEASE_KEEP": 5,
+            "TRIGGER_HOST": '127.0.0.1',
+            "TRIGGER_PORT": 8765,
+            "TRIGGER_JOBS": 2,
+            "COMPRESS_ENABLED": False,
+            "COMPRESS_LEVEL": 9,
+            "COMPRESS_MIN_SIZE": 1024,
+            "COMPRESS_EXTENSIONS": ('.html', '.htm', '.css', '.js', '.svg', '.json', '.xml', '.txt'),
+            "COMPRESS_BROTLI": False,
+            "COMPRESS_JOBS": None,
+            "SEARCH_ENABLED": False,
+            "SEARCH_INDEX": None,
+            "CACHE_DIR": join(dirname(dirname(abspath(__file__))), "cache"),
+            "CACHE_MAX_BYTES": 0,
+            "MAKE_JOBSERVER": False,
+            "JOBSERVER_SLOTS": None,
+            "BUILD_CPU_LIMIT": None,
+            "BUILD_MEMORY_LIMIT": None,
+            "BUILD_NICE": None,
+            "LOCK_DIR": None,
+            "LOCK_COALESCE": False
         }
 
     def __getitem__(self, name):
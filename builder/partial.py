@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+
+
+def changed_files(project_dir: str, old_head: str, new_head: str):
+    ret = subprocess.run(["git", "diff", "--name-only", "-z", old_head, new_head], cwd=project_dir,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if ret.returncode != 0:
+        return None
+    return [name for name in ret.stdout.decode('utf-8').split('\0') if name]
+
+
+def select_partial(partial: dict, changed: list):
+    """Return the build commands and publish outputs covering ``changed`` files, or None when some
+    file matches no path prefix of ``partial`` and the whole service has to be rebuilt."""
+    if not changed:
+        return None
+    commands = []
+    outputs = []
+    full_publish = False
+    for path in changed:
+        rules = [rule for prefix, rule in partial.items() if path.startswith(prefix)]
+        if not rules:
+            return None
+        for rule in rules:
+            commands.extend(cmd for cmd in rule['build'] if cmd not in commands)
+            if 'publish' not in rule:
+                full_publish = True
+            else:
+                outputs.extend(output for output in rule['publish'] if output not in outputs)
+    return commands, None if full_publish else [os.path.normpath(output) for output in outputs]
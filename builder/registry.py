@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from os.path import exists, splitext
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def is_sqlite_database(path: str):
+    return splitext(path)[1] in SQLITE_EXTENSIONS
+
+
+def load_services(path: str):
+    if is_sqlite_database(path):
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT name, config FROM services ORDER BY rowid").fetchall()
+        return {name: json.loads(config) for name, config in rows}
+    with open(path, 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_services(path: str, services: dict):
+    if is_sqlite_database(path):
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS services (name TEXT PRIMARY KEY, config TEXT NOT NULL)")
+            conn.execute("DELETE FROM services")
+            conn.executemany("INSERT INTO services (name, config) VALUES (?, ?)",
+                             [(name, json.dumps(config, ensure_ascii=False)) for name, config in services.items()])
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(services, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def validate_partial(partial, build_cmds):
+    if not isinstance(partial, dict):
+        return "<partial> must map path prefixes to build rules"
+    for prefix, rule in partial.items():
+        if not isinstance(rule, dict) or not isinstance(rule.get('build'), list) or \
+                not all(cmd in build_cmds and cmd.startswith("make") for cmd in rule['build']):
+            return "<partial> rule of {} must list make commands of <build>".format(prefix)
+        if 'publish' in rule and (not isinstance(rule['publish'], list) or
+                                  not all(isinstance(output, str) and not os.path.isabs(output) and
+                                          '..' not in os.path.normpath(output).split(os.sep)
+                                          for output in rule['publish'])):
+            return "<partial> rule of {} must list publish outputs inside the publish dir".format(prefix)
+    return None
+
+
+def validate_service(service_name: str, service):
+    if not isinstance(service, dict):
+        return "service must be an object"
+    if 'build' in service:
+        if not isinstance(service['build'], list) or not all(isinstance(cmd, str) for cmd in service['build']):
+            return "<build> must be a list of commands"
+        if not isinstance(service.get('source', ''), str):
+            return "<source> must be a string"
+    if 'publish' in service and not isinstance(service['publish'], str):
+        return "<publish> must be a path"
+    if 'env' in service and (not isinstance(service['env'], dict) or
+                             not all(isinstance(key, str) for key in service['env'])):
+        return "<env> must be an object of environment variables"
+    if 'depends_on' in service:
+        depends_on = service['depends_on']
+        if not isinstance(depends_on, list) or not all(isinstance(name, str) for name in depends_on):
+            return "<depends_on> must be a list of service names"
+        if service_name in depends_on:
+            return "<depends_on> must not contain the service itself"
+    if 'partial' in service:
+        error = validate_partial(service['partial'], service.get('build', []))
+        if error:
+            return error
+    if 'limits' in service:
+        limits = service['limits']
+        if not isinstance(limits, dict) or not set(limits) <= {'cpu', 'memory', 'nice'} or \
+                not all(isinstance(value, int) and value >= 0 for value in limits.values()):
+            return "<limits> must map cpu, memory or nice to non-negative integers"
+    return None
+
+
+class ServiceRegistry:
+    def __init__(self, database_file: str):
+        self.database_file = database_file
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._services = {}
+        self._build_services = []
+        self._publish_services = []
+        self._build_set = frozenset()
+        self._publish_set = frozenset()
+        self.version = 0
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.database_file)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        services = {}
+        for service_name, service in load_services(self.database_file).items():
+            error = validate_service(service_name, service)
+            if error:
+                self.logger.error("invalid service <{}>: {}".format(service_name, error))
+                continue
+            services[service_name] = service
+        return services
+
+    def refresh(self):
+        with self._lock:
+            signature = self._stat_signature()
+            if signature == self._signature:
+                return
+            services = self._load() if signature else {}
+            self._services = services
+            self._build_services = [name for name, service in services.items() if 'build' in service]
+            self._publish_services = [name for name, service in services.items() if 'publish' in service]
+            self._build_set = frozenset(self._build_services)
+            self._publish_set = frozenset(self._publish_services)
+            self._signature = signature
+            self.version += 1
+
+    def exists(self):
+        return exists(self.database_file)
+
+    def services(self):
+        self.refresh()
+        return self._services
+
+    def get(self, service_name: str):
+        self.refresh()
+        return self._services.get(service_name)
+
+    def build_services(self):
+        self.refresh()
+        return list(self._build_services)
+
+    def publish_services(self):
+        self.refresh()
+        return list(self._publish_services)
+
+    def is_build_service(self, service_name: str):
+        self.refresh()
+        return service_name in self._build_set
+
+    def is_publish_service(self, service_name: str):
+        self.refresh()
+        return service_name in self._publish_set
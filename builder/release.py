@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import filecmp
+import threading
+from os.path import join, exists, isdir, islink, dirname, basename, realpath
+from shutil import copy2, copystat, rmtree
+from .compress import COMPRESSED_SUFFIXES
+
+
+def new_release_id(timestamp=None):
+    moment = datetime.datetime.now() if timestamp is None else datetime.datetime.fromtimestamp(timestamp)
+    return moment.strftime('%Y%m%d%H%M%S%f')
+
+
+def list_releases(release_root: str):
+    if not exists(release_root):
+        return []
+    return sorted(name for name in os.listdir(release_root)
+                  if isdir(join(release_root, name)) and not name.startswith('.'))
+
+
+def current_release(live_path: str):
+    if not islink(live_path):
+        return None
+    return basename(realpath(live_path))
+
+
+def _same_file(src_name, src_stat, previous_name):
+    try:
+        previous_stat = os.stat(previous_name)
+    except FileNotFoundError:
+        return False
+    if previous_stat.st_size != src_stat.st_size:
+        return False
+    if previous_stat.st_mtime_ns == src_stat.st_mtime_ns:
+        return True
+    return filecmp.cmp(src_name, previous_name, shallow=False)
+
+
+def create_release(src: str, release_dir: str, previous_dir=None, ignore=None):
+    """Copy ``src`` into a new ``release_dir``, hardlinking files unchanged from ``previous_dir``."""
+    stats = {'linked': 0, 'copied': 0, 'copied_bytes': 0, 'linked_bytes': 0}
+
+    def walk(rel):
+        src_dir = join(src, rel)
+        dst_dir = join(release_dir, rel)
+        os.makedirs(dst_dir, exist_ok=True)
+        names = os.listdir(src_dir)
+        ignored_names = ignore(src_dir, names) if ignore is not None else set()
+        for name in names:
+            if name in ignored_names:
+                continue
+            src_name = join(src_dir, name)
+            dst_name = join(dst_dir, name)
+            if isdir(src_name):
+                walk(join(rel, name))
+                continue
+            st = os.stat(src_name)
+            if previous_dir is not None:
+                previous_name = join(previous_dir, rel, name)
+                if _same_file(src_name, st, previous_name):
+                    os.link(previous_name, dst_name)
+                    stats['linked'] += 1
+                    stats['linked_bytes'] += st.st_size
+                    # keep precompressed siblings of unchanged files too
+                    for suffix in COMPRESSED_SUFFIXES:
+                        if exists(previous_name + suffix) and name + suffix not in names:
+                            os.link(previous_name + suffix, dst_name + suffix)
+                    continue
+            copy2(src_name, dst_name)
+            stats['copied'] += 1
+            stats['copied_bytes'] += st.st_size
+        copystat(src_dir, dst_dir)
+
+    walk('')
+    return stats
+
+
+def adopt_live_dir(live_path: str, release_root: str):
+    """Move a plain publish directory from copy/delta mode out of the way of the first release symlink.
+
+    A non-empty directory is kept as a release named after its mtime, so it sorts before the release
+    replacing it. Returns the adopted release directory, if any; this one switch is not atomic.
+    """
+    if not isdir(live_path) or islink(live_path):
+        return None
+    if not os.listdir(live_path):
+        os.rmdir(live_path)
+        return None
+    release_dir = join(release_root, new_release_id(os.stat(live_path).st_mtime))
+    os.makedirs(release_root, exist_ok=True)
+    os.rename(live_path, release_dir)
+    return release_dir
+
+
+def activate_release(live_path: str, release_dir: str):
+    """Atomically point ``live_path`` at ``release_dir`` by renaming a fresh symlink over it."""
+    tmp_link = "{}.tmp-{}-{}".format(live_path, os.getpid(), threading.get_ident())
+    if islink(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(release_dir, dirname(live_path)), tmp_link)
+    os.replace(tmp_link, live_path)
+
+
+def prune_releases(release_root: str, keep: int, current=None):
+    removed = []
+    releases = list_releases(release_root)
+    for name in releases[:max(len(releases) - keep, 0)]:
+        if name == current:
+            continue
+        rmtree(join(release_root, name))
+        removed.append(name)
+    return removed
+
+
+def previous_release(release_root: str, current: str):
+    releases = list_releases(release_root)
+    if current not in releases:
+        return None
+    index = releases.index(current)
+    return releases[index - 1] if index > 0 else None
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import signal
+import datetime
+import threading
+import subprocess
+from collections import deque
+from os.path import exists, dirname
+
+READ_SIZE = 65536
+
+
+class BuildLog:
+    def __init__(self, path: str, max_bytes=0, backup_count=0, tail_lines=50):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lines = deque(maxlen=tail_lines)
+        os.makedirs(dirname(path), exist_ok=True)
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = "{}.{}".format(self.path, i)
+                if exists(src):
+                    os.replace(src, "{}.{}".format(self.path, i + 1))
+            os.replace(self.path, self.path + '.1')
+        self._file = open(self.path, 'wb')
+        self._size = 0
+
+    def write(self, line: bytes):
+        if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._size += len(line)
+        self.lines.append(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+
+    def write_header(self, text: str):
+        self.write("[{}] {}\n".format(datetime.datetime.now().isoformat(timespec='seconds'), text).encode('utf-8'))
+
+    def tail(self):
+        return '\n'.join(self.lines)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_output(stream, chunk_size=READ_SIZE):
+    """Yield the output of ``stream`` split into lines at newlines and carriage returns, and into pieces
+    of at most ``chunk_size`` bytes, so progress bars or output without newlines never pile up in memory."""
+    pending = b''
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.splitlines(keepends=True)
+        # a trailing \r may be the first half of \r\n, keep it for the next chunk
+        pending = lines.pop() if not lines[-1].endswith(b'\n') else b''
+        for line in lines:
+            for start in range(0, len(line), chunk_size):
+                yield line[start:start + chunk_size]
+        while len(pending) >= chunk_size:
+            yield pending[:chunk_size]
+            pending = pending[chunk_size:]
+    if pending:
+        yield pending
+
+
+class CommandResult:
+    def __init__(self, returncode: int, duration: float, timed_out=False, rusage=None):
+        self.returncode = returncode
+        self.duration = duration
+        self.timed_out = timed_out
+        self.rusage = rusage
+
+    @property
+    def success(self):
+        return self.returncode == 0 and not self.timed_out
+
+
+def wait_with_rusage(proc: subprocess.Popen):
+    if not hasattr(os, 'wait4'):
+        return proc.wait(), None
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, rusage
+
+
+def kill_process_group(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_command(cmd: list, cwd: str, build_log: BuildLog, timeout=None, env=None, pass_fds=()):
+    """Run ``cmd`` in its own process group, streaming stdout and stderr into ``build_log``."""
+    start = time.monotonic()
+    build_log.write_header("$ {} (in {})".format(' '.join(cmd), cwd))
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            stdin=subprocess.DEVNULL, start_new_session=True, env=env,
+                            pass_fds=pass_fds)
+    timed_out = threading.Event()
+    # held while the child is reaped, so the timer never signals a process group whose pid was reused
+    reap_lock = threading.Lock()
+    timer = None
+    if timeout is not None:
+        def expire():
+            with reap_lock:
+                if proc.returncode is None:
+                    timed_out.set()
+                    kill_process_group(proc)
+        timer = threading.Timer(max(timeout, 0), expire)
+        timer.daemon = True
+        timer.start()
+    try:
+        for line in iter_output(proc.stdout):
+            build_log.write(line)
+        if hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        with reap_lock:
+            returncode, rusage = wait_with_rusage(proc)
+    except BaseException:
+        with reap_lock:
+            if proc.returncode is None:
+                kill_process_group(proc)
+                proc.wait()
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+        proc.stdout.close()
+    duration = time.monotonic() - start
+    if timed_out.is_set():
+        build_log.write_header("killed after {:.1f}s timeout".format(duration))
+    return CommandResult(returncode, duration, timed_out.is_set(), rusage)
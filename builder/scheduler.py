@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime
+import hashlib
+import logging
+import signal
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+CRON_MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+# (minimum, maximum) of minute, hour, day of month, month, day of week
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def parse_cron_field(field: str, minimum: int, maximum: int):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError("invalid step in {}".format(field))
+        if part == '*':
+            start, end = minimum, maximum
+        elif '-' in part:
+            start, end = [int(value) for value in part.split('-', 1)]
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+        if start < minimum or end > maximum or start > end:
+            raise ValueError("{} out of range {}-{}".format(field, minimum, maximum))
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def spread_cron(expression: str, key: str):
+    """Move the fixed minute (and the hour of daily or longer macros) of ``expression`` to a stable
+    offset derived from ``key``, so services sharing a schedule do not all start at once."""
+    offset = int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16)
+    macro = expression.strip() in CRON_MACROS
+    fields = CRON_MACROS.get(expression.strip(), expression).split()
+    if len(fields) != 5:
+        return expression
+    minute, hour = fields[0], fields[1]
+    if minute.isdigit():
+        fields[0] = str(offset % 60)
+    elif minute.startswith('*/') and minute[2:].isdigit() and int(minute[2:]) > 0:
+        fields[0] = '{}-59/{}'.format(offset % int(minute[2:]), minute[2:])
+    if macro and hour.isdigit():
+        fields[1] = str(offset // 60 % 24)
+    return ' '.join(fields)
+
+
+class CronExpression:
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError("crontab expression needs 5 fields: {}".format(expression))
+        self.minutes, self.hours, self.days, self.months, weekdays = \
+            [parse_cron_field(field, *limits) for field, limits in zip(fields, CRON_RANGES)]
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def matches(self, now: datetime.datetime):
+        if now.minute not in self.minutes or now.hour not in self.hours or now.month not in self.months:
+            return False
+        day_match = now.day in self.days
+        weekday_match = (now.weekday() + 1) % 7 in self.weekdays
+        # like cron, a restricted day of month and day of week match if either one does; a field starting
+        # with * (like */2) is unrestricted
+        if self.any_day or self.any_weekday:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+
+class Scheduler:
+    def __init__(self, builder_manager, jobs=None):
+        self.builder_manager = builder_manager
+        self.registry = builder_manager.registry
+        self.jobs = jobs if jobs else builder_manager.setting['DAEMON_JOBS']
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.schedule = {}
+        self.running = set()
+        self.tasks = set()
+        self._version = None
+        self.last_tick = None
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+
+    def load_schedule(self):
+        try:
+            self.registry.refresh()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            # e.g. a half-written database file, keep running with the previous schedule
+            self.logger.error("reload services failed, keep previous schedule: {}".format(e))
+            return False
+        if self._version == self.registry.version:
+            return False
+        schedule = {}
+        for service_name, service in self.registry.services().items():
+            cron = service.get('synchronization', {}).get('crontab')
+            if not cron:
+                continue
+            if self.builder_manager.setting['CRON_SPREAD']:
+                cron = spread_cron(cron, service_name)
+            try:
+                schedule[service_name] = CronExpression(cron)
+            except ValueError as e:
+                self.logger.error("invalid crontab of <{}>: {}".format(service_name, e))
+        self.schedule = schedule
+        self._version = self.registry.version
+        self.logger.info("schedule loaded: {} services".format(len(schedule)))
+        return True
+
+    def tick(self, now: datetime.datetime):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.jobs)
+        minute = now.replace(second=0, microsecond=0)
+        if self.last_tick is not None and minute <= self.last_tick:
+            return []
+        self.last_tick = minute
+        self.load_schedule()
+        started = []
+        for service_name, cron in self.schedule.items():
+            if not cron.matches(now):
+                continue
+            if service_name in self.running:
+                self.logger.warning("<{}> still running, skip scheduled run".format(service_name))
+                continue
+            self.running.add(service_name)
+            task = asyncio.ensure_future(self._run_service(service_name))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            started.append(service_name)
+        return started
+
+    async def _run_service(self, service_name: str):
+        try:
+            async with self._semaphore:
+                self.logger.info("scheduled run <{}>".format(service_name))
+                loop = asyncio.get_running_loop()
+                success = await loop.run_in_executor(self._executor, self.builder_manager.batchrun_service,
+                                                     service_name)
+                if not success:
+                    self.logger.error("scheduled run <{}> failed".format(service_name))
+        except Exception:
+            self.logger.exception("scheduled run <{}> raised".format(service_name))
+        finally:
+            self.running.discard(service_name)
+
+    async def run(self, stop_event: asyncio.Event = None):
+        stop_event = stop_event if stop_event else asyncio.Event()
+        self.load_schedule()
+        self.logger.info("scheduler started with {} jobs".format(self.jobs))
+        try:
+            while not stop_event.is_set():
+                now = datetime.datetime.now()
+                next_minute = now.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+                if self.last_tick is not None and next_minute <= self.last_tick:
+                    next_minute = self.last_tick + datetime.timedelta(minutes=1)
+                try:
+                    await asyncio.wait_for(stop_event.wait(), (next_minute - now).total_seconds())
+                except asyncio.TimeoutError:
+                    self.tick(next_minute)
+            if self.tasks:
+                await asyncio.wait(self.tasks)
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def run_daemon(builder_manager, jobs=None):
+    scheduler = Scheduler(builder_manager, jobs)
+
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await scheduler.run(stop_event)
+
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+from os.path import join, dirname, relpath
+from html.parser import HTMLParser
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    service TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    UNIQUE (service, path)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(title, body, tokenize='unicode61');
+'''
+
+
+class TextExtractor(HTMLParser):
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = []
+        self.body = []
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'title':
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == 'title':
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title.append(data)
+        else:
+            self.body.append(data)
+
+
+def extract_text(path: str):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        parser = TextExtractor()
+        parser.feed(f.read())
+        parser.close()
+    return ' '.join(''.join(parser.title).split()), ' '.join(' '.join(parser.body).split())
+
+
+def fts_query(query: str):
+    # quote every term so user input cannot break the FTS5 query syntax; terms are ANDed
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+class SearchIndex:
+    def __init__(self, path: str, extensions=('.html', '.htm')):
+        self.path = path
+        self.extensions = tuple(extensions)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def update_service(self, service_name: str, root: str):
+        """Reindex pages of ``service_name`` under ``root`` whose size or mtime changed."""
+        stats = {'indexed': 0, 'unchanged': 0, 'removed': 0}
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    known = {path: (page_id, size, mtime) for page_id, path, size, mtime in conn.execute(
+                        "SELECT id, path, size, mtime FROM pages WHERE service = ?", (service_name,))}
+                    seen = set()
+                    for dir_path, _, file_names in os.walk(root):
+                        for name in file_names:
+                            if not name.endswith(self.extensions):
+                                continue
+                            full_path = join(dir_path, name)
+                            path = relpath(full_path, root)
+                            seen.add(path)
+                            st = os.stat(full_path)
+                            old = known.get(path)
+                            if old and old[1] == st.st_size and old[2] == st.st_mtime_ns:
+                                stats['unchanged'] += 1
+                                continue
+                            title, body = extract_text(full_path)
+                            if old:
+                                page_id = old[0]
+                                conn.execute("UPDATE pages SET size = ?, mtime = ? WHERE id = ?",
+                                             (st.st_size, st.st_mtime_ns, page_id))
+                                conn.execute("DELETE FROM page_text WHERE rowid = ?", (page_id,))
+                            else:
+                                page_id = conn.execute(
+                                    "INSERT INTO pages (service, path, size, mtime) VALUES (?, ?, ?, ?)",
+                                    (service_name, path, st.st_size, st.st_mtime_ns)).lastrowid
+                            conn.execute("INSERT INTO page_text (rowid, title, body) VALUES (?, ?, ?)",
+                                         (page_id, title, body))
+                            stats['indexed'] += 1
+                    for path, (page_id, _, _) in known.items():
+                        if path not in seen:
+                            conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+                            conn.execute("DELETE FROM page_text WHERE rowid = ?", (page_id,))
+                            stats['removed'] += 1
+            finally:
+                conn.close()
+        return stats
+
+    def search(self, query: str, limit=20, service_name=None):
+        query = fts_query(query)
+        if not query:
+            return []
+        sql = "SELECT pages.service, pages.path, page_text.title, " \
+              "snippet(page_text, 1, '[', ']', '...', 12) FROM page_text " \
+              "JOIN pages ON pages.id = page_text.rowid WHERE page_text MATCH ?"
+        params = [query]
+        if service_name:
+            sql += " AND pages.service = ?"
+            params.append(service_name)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
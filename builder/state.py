@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import fcntl
+import hashlib
+import subprocess
+import threading
+from contextlib import contextmanager
+from os.path import dirname
+
+
+def git_head(project_dir: str):
+    ret = subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_dir,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if ret.returncode != 0:
+        return None
+    return ret.stdout.decode('utf-8').strip()
+
+
+def recipe_hash(build_cmds: list, env=None, upstreams=None):
+    # upstreams maps each upstream service to its last successful build, so a rebuilt upstream
+    # invalidates the cached build of its dependents
+    recipe = [build_cmds, env] if env else build_cmds
+    if upstreams:
+        recipe = [build_cmds, env, upstreams]
+    return hashlib.sha256(json.dumps(recipe, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class BuildState:
+    # service name -> {"head": ..., "recipe": ..., "time": ..., "published": ...} of the last successful
+    # build, "published" being the head of the last successful publish of that build. Several
+    # processes (one cron --batchrun per service) share the file, so every change re-reads and merges
+    # it under an flock instead of writing back a stale snapshot.
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        self._signature = None
+        self._reload()
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (st.st_mtime_ns, st.st_size, st.st_ino) == self._signature:
+            return
+        with open(self.path, 'r', encoding="utf-8") as f:
+            self._records = json.load(f)
+        self._signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self, service_name: str):
+        with self._lock:
+            self._reload()
+            return self._records.get(service_name)
+
+    def set(self, service_name: str, record: dict):
+        with self._lock, self._file_lock():
+            self._reload()
+            self._records[service_name] = record
+            self._save()
+
+    def update(self, service_name: str, **fields):
+        with self._lock, self._file_lock():
+            self._reload()
+            if service_name in self._records:
+                self._records[service_name] = dict(self._records[service_name], **fields)
+                self._save()
+
+    def clear(self, service_name: str):
+        with self._lock, self._file_lock():
+            self._reload()
+            if self._records.pop(service_name, None) is not None:
+                self._save()
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(self._records, f, indent=2)
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self._signature = (st.st_mtime_ns, st.st_size, st.st_ino)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from os.path import exists, dirname
+
+
+def rusage_fields(rusage):
+    if rusage is None:
+        return {}
+    return {'cpu_user': rusage.ru_utime, 'cpu_system': rusage.ru_stime, 'max_rss_kb': rusage.ru_maxrss}
+
+
+def percentile(values: list, fraction: float):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = fraction * (len(values) - 1)
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class History:
+    # append-only JSON lines, one record per timed build command, publish or sync step
+    def __init__(self, path: str, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def record(self, service: str, phase: str, step: str, duration: float, success=True, **fields):
+        if not self.enabled:
+            return
+        record = {'time': time.time(), 'service': service, 'phase': phase, 'step': step,
+                  'duration': duration, 'success': success}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding="utf-8") as f:
+                f.write(line)
+
+    def records(self, service=None):
+        if not exists(self.path):
+            return
+        with open(self.path, 'r', encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if service is None or record.get('service') == service:
+                    yield record
+
+
+def summarize(records, trend_window=5):
+    groups = {}
+    for record in records:
+        groups.setdefault((record['service'], record['phase'], record['step']), []).append(record)
+    rows = []
+    for (service, phase, step), group in sorted(groups.items()):
+        durations = [record['duration'] for record in group]
+        cpu = [record.get('cpu_user', 0) + record.get('cpu_system', 0) for record in group]
+        trend = None
+        if len(durations) >= 2 * trend_window:
+            recent = sum(durations[-trend_window:]) / trend_window
+            previous = sum(durations[-2 * trend_window:-trend_window]) / trend_window
+            if previous > 0:
+                trend = (recent - previous) / previous
+        rows.append({
+            'service': service, 'phase': phase, 'step': step, 'count': len(group),
+            'failed': sum(1 for record in group if not record.get('success', True)),
+            'p50': percentile(durations, 0.5), 'p90': percentile(durations, 0.9),
+            'p99': percentile(durations, 0.99), 'cpu_mean': sum(cpu) / len(cpu),
+            'max_rss_kb': max(record.get('max_rss_kb', 0) for record in group),
+            'bytes': sum(record.get('bytes', 0) for record in group), 'trend': trend
+        })
+    return rows
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+from os.path import join, exists
+from .runner import wait_with_rusage
+
+
+def run_git(args, cwd=None, usage=None):
+    proc = subprocess.Popen(["git"] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            stdin=subprocess.DEVNULL)
+    with proc.stdout:
+        output = proc.stdout.read()
+    returncode, rusage = wait_with_rusage(proc)
+    if usage is not None and rusage is not None:
+        usage['cpu_user'] = usage.get('cpu_user', 0) + rusage.ru_utime
+        usage['cpu_system'] = usage.get('cpu_system', 0) + rusage.ru_stime
+        usage['max_rss_kb'] = max(usage.get('max_rss_kb', 0), rusage.ru_maxrss)
+    return returncode == 0, output.decode('utf-8', errors='replace').strip()
+
+
+def update_mirror(source: str, mirror_dir: str, usage=None):
+    if exists(mirror_dir):
+        return run_git(["remote", "update", "--prune"], cwd=mirror_dir, usage=usage)
+    os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+    return run_git(["clone", "--mirror", "--quiet", source, mirror_dir], usage=usage)
+
+
+def clone_options(depth=None, filter_spec=None):
+    options = []
+    if depth:
+        options.append("--depth={}".format(depth))
+    if filter_spec:
+        options.append("--filter={}".format(filter_spec))
+    return options
+
+
+def sync_repository(source: str, dest: str, depth=None, filter_spec=None, reference=None, usage=None):
+    """Clone ``source`` into ``dest``, or fetch and reset an existing checkout to its upstream."""
+    if not exists(join(dest, '.git')):
+        os.makedirs(dest, exist_ok=True)
+        args = ["clone", "--quiet"] + clone_options(depth, filter_spec)
+        if reference:
+            # the mirror prunes deleted branches and gc may then drop their objects, so the checkout
+            # copies what it borrows instead of keeping the mirror as an alternate
+            args += ["--reference-if-able={}".format(reference), "--dissociate"]
+        return run_git(args + [source, dest], usage=usage)
+    success, output = run_git(["fetch", "--quiet", "--prune"] + clone_options(depth, filter_spec) + ["origin"],
+                              cwd=dest, usage=usage)
+    if not success:
+        return success, output
+    return run_git(["reset", "--quiet", "--hard", "@{upstream}"], cwd=dest, usage=usage)
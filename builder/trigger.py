@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TriggerQueue:
+    # a burst of triggers for one service collapses into one queued build; while it is running
+    # at most one follow-up build is kept
+    def __init__(self, run, workers=1):
+        self.run = run
+        self.workers = workers
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._running = {}
+        self._follow_up = set()
+        self._threads = []
+        self._stopped = False
+
+    def trigger(self, service_name: str):
+        with self._cond:
+            if service_name in self._running:
+                if service_name in self._follow_up:
+                    return 'coalesced'
+                self._follow_up.add(service_name)
+                return 'follow-up'
+            if service_name in self._pending:
+                return 'coalesced'
+            self._pending[service_name] = time.time()
+            self._cond.notify()
+            return 'queued'
+
+    def status(self):
+        with self._cond:
+            now = time.time()
+            return {
+                'queue_depth': len(self._pending) + len(self._follow_up),
+                'pending': list(self._pending),
+                'follow_up': sorted(self._follow_up),
+                'running': {name: round(now - start, 3) for name, start in self._running.items()}
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                service_name, _ = self._pending.popitem(last=False)
+                self._running[service_name] = time.time()
+            try:
+                self.run(service_name)
+            except Exception:
+                self.logger.exception("triggered build <{}> raised".format(service_name))
+            finally:
+                with self._cond:
+                    del self._running[service_name]
+                    if service_name in self._follow_up:
+                        self._follow_up.discard(service_name)
+                        self._pending[service_name] = time.time()
+                        self._cond.notify()
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class TriggerHandler(BaseHTTPRequestHandler):
+    # server.queue and server.registry are set by TriggerServer
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/status':
+            self._reply(200, self.server.queue.status())
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'rebuild':
+            self._reply(404, {'error': 'not found'})
+            return
+        service_name = parts[1]
+        registry = self.server.registry
+        if not registry.is_build_service(service_name) and not registry.is_publish_service(service_name):
+            self._reply(404, {'error': 'unknown service', 'service': service_name})
+            return
+        self._reply(202, {'service': service_name, 'result': self.server.queue.trigger(service_name)})
+
+    def log_message(self, format, *args):
+        logging.getLogger(self.__class__.__name__).info(format % args)
+
+
+class TriggerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, queue: TriggerQueue, registry):
+        super().__init__(address, TriggerHandler)
+        self.queue = queue
+        self.registry = registry
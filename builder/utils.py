@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import copy
+import json
+import queue
+import atexit
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from os.path import join
 from .minisetting import Setting
 
+LOGGING_SETTINGS = ('LOG_ENABLED', 'LOG_FORMAT', 'LOG_LEVEL', 'LOG_FILE', 'LOG_DIR', 'LOG_JSON',
+                    'LOG_SERVICE_FILES', 'LOG_MAX_BYTES', 'LOG_BACKUP_COUNT')
+
+_log_context = threading.local()
+_logging_lock = threading.Lock()
+_logging_state = {'key': None, 'handler': None, 'listener': None, 'atexit': False}
+
 
 def get_version(setting: Setting = None):
     setting = setting if setting else Setting()
@@ -22,19 +38,135 @@ def set_logger(setting: Setting, log_enable=True, log_level='DEBUG', log_file=No
         setting['LOG_DIR'] = log_dir
 
 
+class ContextFilter(logging.Filter):
+    # adds the service and phase of the current thread's log_context to every record
+    def filter(self, record):
+        for key, value in getattr(_log_context, 'fields', {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+@contextmanager
+def log_context(service=None, phase=None):
+    previous = getattr(_log_context, 'fields', {})
+    fields = dict(previous)
+    if service is not None:
+        fields['service'] = service
+    if phase is not None:
+        fields['phase'] = phase
+    _log_context.fields = fields
+    try:
+        yield
+    finally:
+        _log_context.fields = previous
+
+
+class ContextQueueHandler(QueueHandler):
+    # unlike QueueHandler.prepare, keeps exc_info so the listener's formatters render tracebacks
+    # themselves; the JSON formatter puts them into an "exception" field
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    FIELDS = ('service', 'phase', 'duration')
+
+    def format(self, record):
+        data = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                'message': record.getMessage()}
+        for field in self.FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class ServiceFileHandler(logging.Handler):
+    # routes records carrying a service to a rotating <log_dir>/<service>.log, keeping at most
+    # max_open files open
+    def __init__(self, log_dir, max_bytes=0, backup_count=0, max_open=32):
+        super().__init__()
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_open = max_open
+        self._handlers = OrderedDict()
+
+    def emit(self, record):
+        service = getattr(record, 'service', None)
+        if not service:
+            return
+        handler = self._handlers.get(service)
+        if handler is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            handler = RotatingFileHandler(join(self.log_dir, service + '.log'), maxBytes=self.max_bytes,
+                                          backupCount=self.backup_count, encoding='utf-8', delay=True)
+            handler.setFormatter(self.formatter)
+            self._handlers[service] = handler
+            if len(self._handlers) > self.max_open:
+                self._handlers.popitem(last=False)[1].close()
+        else:
+            self._handlers.move_to_end(service)
+        handler.emit(record)
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+def _stop_logging():
+    if _logging_state['handler'] is not None:
+        logging.getLogger().removeHandler(_logging_state['handler'])
+    if _logging_state['listener'] is not None:
+        _logging_state['listener'].stop()
+        for handler in _logging_state['listener'].handlers:
+            handler.close()
+    _logging_state.update(key=None, handler=None, listener=None)
+
+
 def config_logging(setting=None):
+    """Install one queue-backed handler set per process; file and console writes happen on a listener thread."""
     setting = setting if setting else Setting()
-    logger = logging.getLogger()
-    logger.setLevel(setting['LOG_LEVEL'])
-    formatter = logging.Formatter(setting['LOG_FORMAT'])
-    if setting['LOG_FILE']:
-        log_file = logging.FileHandler(join(setting['LOG_DIR'], setting['LOG_FILE']))
-        log_file.setFormatter(formatter)
-    console = logging.StreamHandler()
-    console.setFormatter(formatter)
-    if setting['LOG_ENABLED']:
-        if setting['LOG_FILE']:
-            logger.addHandler(log_file)
-        logger.addHandler(console)
-    else:
-        logger.addHandler(logging.NullHandler())
+    key = tuple(str(setting[name]) for name in LOGGING_SETTINGS)
+    with _logging_lock:
+        if _logging_state['key'] == key:
+            return
+        _stop_logging()
+        logger = logging.getLogger()
+        logger.setLevel(setting['LOG_LEVEL'])
+        if not setting['LOG_ENABLED']:
+            handler = logging.NullHandler()
+            listener = None
+        else:
+            if setting['LOG_JSON']:
+                formatter = JsonFormatter()
+            else:
+                formatter = logging.Formatter(setting['LOG_FORMAT'])
+            handlers = []
+            if setting['LOG_FILE']:
+                os.makedirs(setting['LOG_DIR'], exist_ok=True)
+                handlers.append(logging.FileHandler(join(setting['LOG_DIR'], setting['LOG_FILE'])))
+            handlers.append(logging.StreamHandler())
+            if setting['LOG_SERVICE_FILES']:
+                handlers.append(ServiceFileHandler(join(setting['LOG_DIR'], 'services'), setting['LOG_MAX_BYTES'],
+                                                   setting['LOG_BACKUP_COUNT']))
+            for log_handler in handlers:
+                log_handler.setFormatter(formatter)
+            log_queue = queue.SimpleQueue()
+            handler = ContextQueueHandler(log_queue)
+            handler.addFilter(ContextFilter())
+            listener = QueueListener(log_queue, *handlers)
+            listener.start()
+        logger.addHandler(handler)
+        _logging_state.update(key=key, handler=handler, listener=listener)
+        if not _logging_state['atexit']:
+            atexit.register(_stop_logging)
+            _logging_state['atexit'] = True
@@ -4,6 +4,7 @@
 import sys
 import os
 import optparse
+import cProfile
 from builder.utils import get_version, set_logger
 from builder import BuilderManager
 from builder.minisetting import Setting
@@ -21,6 +22,33 @@ def print_cmd_result(success=True):
         print("Please check log")
 
 
+def print_batch_summary(summary):
+    for service_name, result in summary.items():
+        if result.get('skipped'):
+            status = "Skipped"
+        elif not result['success']:
+            status = "Failed"
+        elif result.get('cached'):
+            status = "Cached"
+        else:
+            status = "Success"
+        print("{:<30} {:<8} {:.1f}s".format(service_name, status, result['duration']))
+    failed = [name for name, result in summary.items() if not result['success'] and not result.get('skipped')]
+    skipped = [name for name, result in summary.items() if result.get('skipped')]
+    print("{} succeeded, {} failed, {} skipped".format(len(summary) - len(failed) - len(skipped), len(failed),
+                                                       len(skipped)))
+
+
+def print_stats(rows):
+    print("{:<20} {:<8} {:<36} {:>6} {:>9} {:>9} {:>9} {:>9} {:>10} {:>8}".format(
+        "service", "phase", "step", "count", "p50(s)", "p90(s)", "p99(s)", "cpu(s)", "rss(KB)", "trend"))
+    for row in rows:
+        trend = "{:+.0%}".format(row['trend']) if row['trend'] is not None else "-"
+        print("{:<20} {:<8} {:<36} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10} {:>8}".format(
+            row['service'], row['phase'], row['step'][:36], row['count'], row['p50'], row['p90'], row['p99'],
+            row['cpu_mean'], row['max_rss_kb'], trend))
+
+
 def usage_error(error: str):
     print("Usage Error: {} {}".format(os.path.basename(__file__), error))
     print("Try {} -h for more information".format(os.path.basename(__file__)))
@@ -41,6 +69,56 @@ def process(options, args):
     if options.nolog:
         set_logger(setting, log_enable=False)
 
+    if options.logjson:
+        setting['LOG_JSON'] = True
+
+    if options.service_logs:
+        setting['LOG_SERVICE_FILES'] = True
+
+    if options.publish_mode:
+        if options.publish_mode not in ('copy', 'delta', 'release'):
+            usage_error("--publish-mode must be one of copy, delta, release")
+            return False
+        setting['PUBLISH_MODE'] = options.publish_mode
+
+    if options.compress:
+        setting['COMPRESS_ENABLED'] = True
+
+    if options.index:
+        setting['SEARCH_ENABLED'] = True
+
+    if options.keep_releases is not None:
+        setting['RELEASE_KEEP'] = options.keep_releases
+
+    if options.sync_before_build:
+        setting['SYNC_BEFORE_BUILD'] = True
+
+    if options.depth is not None:
+        setting['GIT_CLONE_DEPTH'] = options.depth
+
+    if options.filter:
+        setting['GIT_CLONE_FILTER'] = options.filter
+
+    if options.mirror_dir:
+        setting['GIT_MIRROR_DIR'] = options.mirror_dir
+
+    if options.build_timeout:
+        setting['BUILD_TIMEOUT'] = options.build_timeout
+
+    if options.service_timeout:
+        setting['SERVICE_TIMEOUT'] = options.service_timeout
+
+    if options.spread:
+        setting['CRON_SPREAD'] = True
+
+    if options.coalesce:
+        setting['LOCK_COALESCE'] = True
+
+    if options.make_jobserver is not None:
+        setting['MAKE_JOBSERVER'] = True
+        if options.make_jobserver > 0:
+            setting['JOBSERVER_SLOTS'] = options.make_jobserver
+
     builder_manager = BuilderManager(setting)
 
     if options.list:
@@ -51,12 +129,37 @@ def process(options, args):
         print("Available Build Service: {}".format(build_services))
         print("Available Publish Service: {}".format(publish_services))
         return True
+    if options.export_database:
+        if len(args) > 0:
+            usage_error("--export-database take no argument")
+            return False
+        print_cmd_result(builder_manager.export_database(options.export_database))
+        return True
+    if options.stats:
+        if len(args) > 1:
+            usage_error("--stats take at most 1 argument [service name]")
+            return False
+        print_stats(builder_manager.get_stats(args[0] if args else None))
+        return True
+    if options.search:
+        results = builder_manager.search(options.search, options.limit)
+        for service_name, path, title, snippet in results:
+            print("{}/{}  {}".format(service_name, path, title))
+            print("    {}".format(snippet))
+        print("{} results".format(len(results)))
+        return True
+    if options.clear_cache:
+        if len(args) > 1:
+            usage_error("--clear-cache take at most 1 argument [service name]")
+            return False
+        print_cmd_result(builder_manager.clear_cache(args[0] if args else None))
+        return True
     if options.build:
         if len(args) != 1:
             usage_error("--build only take 1 argument <service name>")
             return False
         service_name = args[0]
-        print_cmd_result(builder_manager.build_service(service_name))
+        print_cmd_result(builder_manager.build_service(service_name, options.force))
         return True
     if options.publish:
         if len(args) != 1:
@@ -65,6 +168,12 @@ def process(options, args):
         service_name = args[0]
         print_cmd_result(builder_manager.publish_service(service_name))
         return True
+    if options.rollback:
+        if len(args) != 1:
+            usage_error("--rollback only take 1 argument <service name>")
+            return False
+        print_cmd_result(builder_manager.rollback_service(args[0]))
+        return True
     if options.autoconf:
         if len(args) > 0:
             usage_error("--autoconf take no argument")
@@ -76,7 +185,43 @@ def process(options, args):
             usage_error("--batchrun only take 1 argument <service name>")
             return False
         service_name = args[0]
-        builder_manager.batchrun_service(service_name)
+        if options.cascade:
+            summary = builder_manager.batchrun_cascade(service_name, options.jobs, options.force)
+            print_batch_summary(summary)
+            return all(result['success'] for result in summary.values())
+        builder_manager.batchrun_service(service_name, options.force)
+        return True
+    if options.batchrun_all:
+        if options.jobs is not None and options.jobs < 1:
+            usage_error("--jobs must be at least 1")
+            return False
+        summary = builder_manager.batchrun_all(args, options.jobs, options.force)
+        print_batch_summary(summary)
+        return all(result['success'] for result in summary.values())
+    if options.sync:
+        results = builder_manager.sync_services(args, options.jobs)
+        for service_name, success in results.items():
+            print("{:<30} {}".format(service_name, "Success" if success else "Failed"))
+        print_cmd_result(all(results.values()))
+        return True
+    if options.daemon:
+        if len(args) > 0:
+            usage_error("--daemon take no argument")
+            return False
+        builder_manager.daemon(options.jobs)
+        return True
+    if options.serve:
+        if len(args) > 0:
+            usage_error("--serve take no argument")
+            return False
+        host, port = None, None
+        if options.listen:
+            host, _, port = options.listen.rpartition(':')
+            if not port.isdigit():
+                usage_error("--listen must be HOST:PORT")
+                return False
+            port = int(port)
+        builder_manager.serve(host, port, options.jobs)
         return True
     if options.init:
         if len(args) > 0:
@@ -103,29 +248,102 @@ def cli(argv=None):
                             help="log level (default: DEBUG)")
     group_global.add_option("--nolog", action="store_true",
                             help="disable logging completely")
+    group_global.add_option("--logjson", action="store_true",
+                            help="write log records as JSON with service, phase and duration")
+    group_global.add_option("--service-logs", action="store_true", dest="service_logs",
+                            help="also write rotating per-service log files under <log directory>/services")
+    group_global.add_option("--profile", metavar="FILE", dest="profile",
+                            help="write a cProfile dump of the run to FILE")
+    group_global.add_option("--publish-mode", metavar="MODE", dest="publish_mode", default=None,
+                            help="publish mode: copy, delta or release (default: copy)")
+    group_global.add_option("--compress", action="store_true", dest="compress",
+                            help="write precompressed .gz (and .br with COMPRESS_BROTLI) files when publishing")
+    group_global.add_option("--index", action="store_true", dest="index",
+                            help="update the search index of published HTML pages when publishing")
+    group_global.add_option("--keep-releases", type="int", metavar="N", dest="keep_releases", default=None,
+                            help="number of releases retained by release publish mode (default: 5)")
     parser.add_option_group(group_global)
 
     parser.add_option("--list", action='store_true', dest='list',
                       help="List all services names available")
+    parser.add_option("--export-database", metavar="FILE", dest="export_database",
+                      help="Export services database to FILE (.json, or .db/.sqlite for SQLite)")
+    parser.add_option("--rollback", action='store_true', dest="rollback",
+                      help="Switch <service name> back to its previous published release")
+    parser.add_option("--stats", action='store_true', dest="stats",
+                      help="Show build, publish and sync timing history of all services or [service name]")
+    parser.add_option("--search", metavar="QUERY", dest="search",
+                      help="Search published pages of all services")
+    parser.add_option("--limit", type="int", metavar="N", dest="limit", default=20,
+                      help="maximum number of --search results (default: 20)")
+    parser.add_option("--clear-cache", action='store_true', dest="clear_cache",
+                      help="Remove the persistent build cache of all services or [service name]")
     parser.add_option("--build", action='store_true', dest="build",
                       help="Build doc for <service name>")
     parser.add_option("--publish", action='store_true', dest="publish",
                       help="Publish for <service name>")
 
+    parser.add_option("--force", action='store_true', dest="force",
+                      help="Build even if source revision and build commands are unchanged")
+
+    parser.add_option("--build-timeout", type="float", metavar="SECONDS", dest="build_timeout",
+                      help="Kill a build command running longer than SECONDS")
+    parser.add_option("--service-timeout", type="float", metavar="SECONDS", dest="service_timeout",
+                      help="Kill the build of a service running longer than SECONDS in total")
+    parser.add_option("--make-jobserver", type="int", metavar="SLOTS", dest="make_jobserver", default=None,
+                      help="Share a make jobserver of SLOTS parallel jobs (0 for CPU count) across the builds "
+                           "of this process (--batchrun-all, --daemon, --serve)")
+
     group_devspace = optparse.OptionGroup(parser, "Devspace Options")
     group_devspace.add_option("--autoconf", action='store_true', dest="autoconf",
                               help="Auto update crontab")
+    group_devspace.add_option("--spread", action='store_true', dest="spread",
+                              help="Spread fixed crontab minutes of services by a stable per-service offset")
     group_devspace.add_option("--batchrun", action='store_true', dest="batchrun",
                               help="Run build and publish for <service name>")
+    group_devspace.add_option("--cascade", action='store_true', dest="cascade",
+                              help="With --batchrun, also run services that depend on <service name>")
+    group_devspace.add_option("--coalesce", action='store_true', dest="coalesce",
+                              help="If <service name> is already running, rerun it once afterwards instead of skipping")
+    group_devspace.add_option("--batchrun-all", action='store_true', dest="batchrun_all",
+                              help="Run build and publish for all services or the given [service name]s")
+    group_devspace.add_option("--jobs", type="int", metavar="N", dest="jobs", default=None,
+                              help="number of services run in parallel by --batchrun-all, --sync, --daemon or --serve")
+    group_devspace.add_option("--daemon", action='store_true', dest="daemon",
+                              help="Run scheduled services in-process according to their crontab")
+    group_devspace.add_option("--serve", action='store_true', dest="serve",
+                              help="Accept POST /rebuild/<service name> triggers over local HTTP")
+    group_devspace.add_option("--listen", metavar="HOST:PORT", dest="listen",
+                              help="address of the --serve endpoint (default: 127.0.0.1:8765)")
     group_devspace.add_option("--init", action='store_true', dest="init",
                       help="For devspace init all service and first checkout")
     parser.add_option_group(group_devspace)
 
+    group_sync = optparse.OptionGroup(parser, "Sync Options")
+    group_sync.add_option("--sync", action='store_true', dest="sync",
+                          help="Clone or update sources of all services or the given [service name]s")
+    group_sync.add_option("--sync-before-build", action='store_true', dest="sync_before_build",
+                          help="Update the source of a service before each batchrun build")
+    group_sync.add_option("--depth", type="int", metavar="N", dest="depth", default=None,
+                          help="Shallow clone and fetch with history truncated to N commits")
+    group_sync.add_option("--filter", metavar="FILTER", dest="filter",
+                          help="Partial clone filter, e.g. blob:none")
+    group_sync.add_option("--mirror-dir", metavar="PATH", dest="mirror_dir",
+                          help="Shared directory of local mirrors used as clone reference")
+    parser.add_option_group(group_sync)
+
     if len(argv) == 1:
         parser.print_help()
     else:
         options, args = parser.parse_args(args=argv[1:])
-        process(options, args)
+        if options.profile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(process, options, args)
+            finally:
+                profiler.dump_stats(options.profile)
+        else:
+            process(options, args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,36 @@
+import os
+import subprocess
+from os.path import join
+from builder.minisetting import Setting
+
+GIT_IDENTITY = ["-c", "user.name=DocBuilder Test", "-c", "user.email=test@example.com"]
+
+
+def make_setting(root):
+    setting = Setting()
+    setting['LOG_ENABLED'] = False
+    setting['DATA_DIR'] = join(root, 'docs')
+    setting['PUBLISH_DIR'] = join(root, 'share')
+    setting['STATE_DIR'] = join(root, 'state')
+    setting['LOG_DIR'] = join(root, 'log')
+    setting['CACHE_DIR'] = join(root, 'cache')
+    setting['DATABASE_FILE'] = join(root, 'database.json')
+    return setting
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding="utf-8") as f:
+        f.write(content)
+
+
+def git(cwd, *args):
+    ret = subprocess.run(["git"] + GIT_IDENTITY + list(args), cwd=cwd,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return ret.stdout.decode('utf-8').strip()
+
+
+def git_commit_all(cwd, message="update"):
+    git(cwd, "add", "-A")
+    git(cwd, "commit", "-q", "-m", message)
+    return git(cwd, "rev-parse", "HEAD")
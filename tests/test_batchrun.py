@@ -0,0 +1,237 @@
+import unittest
+import os
+import json
+import tempfile
+from os.path import join, exists
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from builder.lock import ServiceLock
+from builder.state import BuildState
+from tests.helpers import git, git_commit_all, make_setting, write_file
+
+MAKEFILE = "html:\n\tmkdir -p out\n\techo $(NAME) > out/index.html\n"
+MULTI_MAKEFILE = "html:\n\tmkdir -p out/$(DOC)\n\tcat $(DOC)/page.txt > out/$(DOC)/index.html\n" \
+                 "\techo $(DOC) >> built.txt\n"
+
+
+class BatchrunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = make_setting(self.root)
+        services = {}
+        for name in ['alpha', 'beta', 'gamma']:
+            doc_dir = join(self.setting['DATA_DIR'], name, 'doc')
+            os.makedirs(doc_dir)
+            os.makedirs(join(self.setting['PUBLISH_DIR'], name))
+            with open(join(doc_dir, 'Makefile'), 'w') as f:
+                f.write(MAKEFILE)
+            services[name] = {"build": ["cd doc", "make html NAME={}".format(name)], "publish": "./doc/out"}
+        services['beta']['depends_on'] = ['alpha']
+        services['broken'] = {"build": ["ls"], "publish": "./out"}
+        services['downstream'] = {"publish": "./out", "depends_on": ['broken']}
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        self.builder_manager = BuilderManager(self.setting)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_batchrun_all(self):
+        cwd = os.getcwd()
+        summary = self.builder_manager.batchrun_all(jobs=3)
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(list(summary), ['alpha', 'beta', 'gamma', 'broken', 'downstream'])
+        self.assertTrue(summary['downstream']['skipped'])
+        for name in ['alpha', 'beta', 'gamma']:
+            self.assertTrue(summary[name]['success'])
+            with open(join(self.setting['PUBLISH_DIR'], name, 'index.html')) as f:
+                self.assertEqual(f.read().strip(), name)
+        self.assertFalse(summary['broken']['success'])
+        self.assertFalse(exists(join(self.setting['PUBLISH_DIR'], 'broken')))
+
+        rows = {(row['service'], row['phase'], row['step']): row for row in self.builder_manager.get_stats()}
+        build = rows[('alpha', 'build', 'make html NAME=alpha')]
+        self.assertEqual(build['count'], 1)
+        self.assertGreater(build['max_rss_kb'], 0)
+        self.assertEqual(rows[('alpha', 'publish', 'copy')]['bytes'], len('alpha\n'))
+        self.assertNotIn(('broken', 'publish', 'copy'), rows)
+
+    def test_batchrun_cascade(self):
+        summary = self.builder_manager.batchrun_cascade('alpha')
+        self.assertEqual(list(summary), ['alpha', 'beta'])
+        self.assertTrue(all(result['success'] for result in summary.values()))
+
+    def test_cascade_rebuilds_dependents(self):
+        for name in ['alpha', 'beta']:
+            project_dir = join(self.setting['DATA_DIR'], name)
+            git(project_dir, "init", "-q")
+            git_commit_all(project_dir, "initial")
+        summary = self.builder_manager.batchrun_cascade('alpha')
+        self.assertFalse(summary['beta']['cached'])
+        summary = self.builder_manager.batchrun_cascade('alpha')
+        self.assertTrue(summary['alpha']['cached'])
+        self.assertTrue(summary['beta']['cached'])
+
+        write_file(join(self.setting['DATA_DIR'], 'alpha', 'doc', 'page.rst'), 'page')
+        git_commit_all(join(self.setting['DATA_DIR'], 'alpha'), "add page")
+        summary = self.builder_manager.batchrun_cascade('alpha')
+        self.assertFalse(summary['alpha']['cached'])
+        self.assertFalse(summary['beta']['cached'])
+        self.assertTrue(summary['beta']['success'])
+
+    def test_unknown_dependency(self):
+        with open(self.setting['DATABASE_FILE'], encoding="utf-8") as f:
+            services = json.load(f)
+        services['gamma']['depends_on'] = ['missing']
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        summary = self.builder_manager.batchrun_all(['alpha', 'beta', 'gamma'])
+        self.assertTrue(summary['alpha']['success'])
+        self.assertTrue(summary['beta']['success'])
+        self.assertFalse(summary['gamma']['success'])
+        self.assertTrue(summary['gamma']['skipped'])
+
+    def test_skip_unchanged_build(self):
+        project_dir = join(self.setting['DATA_DIR'], 'alpha')
+        git(project_dir, "init", "-q")
+        git_commit_all(project_dir, "initial")
+        self.assertTrue(self.builder_manager.build_service('alpha'))
+        self.assertNotIn('alpha', self.builder_manager.cache_hits)
+        self.assertTrue(self.builder_manager.build_service('alpha'))
+        self.assertIn('alpha', self.builder_manager.cache_hits)
+        self.assertTrue(self.builder_manager.build_service('alpha', force=True))
+        self.assertNotIn('alpha', self.builder_manager.cache_hits)
+
+        write_file(join(project_dir, 'doc', 'page.rst'), 'page')
+        git_commit_all(project_dir, "add page")
+        summary = self.builder_manager.batchrun_all(['alpha'])
+        self.assertTrue(summary['alpha']['success'])
+        self.assertFalse(summary['alpha']['cached'])
+        summary = self.builder_manager.batchrun_all(['alpha'])
+        self.assertTrue(summary['alpha']['cached'])
+
+    def make_multi(self):
+        project_dir = join(self.setting['DATA_DIR'], 'multi')
+        write_file(join(project_dir, '.gitignore'), "built.txt\nout/\n")
+        write_file(join(project_dir, 'README'), "multi")
+        write_file(join(project_dir, 'doc', 'Makefile'), MULTI_MAKEFILE)
+        for name in ['a', 'b']:
+            write_file(join(project_dir, 'doc', name, 'page.txt'), name)
+        git(project_dir, "init", "-q")
+        git_commit_all(project_dir, "initial")
+        with open(self.setting['DATABASE_FILE'], encoding="utf-8") as f:
+            services = json.load(f)
+        services['multi'] = {"build": ["cd doc", "make html DOC=a", "make html DOC=b"], "publish": "./doc/out",
+                             "partial": {"doc/{}/".format(name): {"build": ["make html DOC={}".format(name)],
+                                                                  "publish": [name]} for name in ['a', 'b']}}
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        return project_dir
+
+    def built(self):
+        with open(join(self.setting['DATA_DIR'], 'multi', 'doc', 'built.txt')) as f:
+            return f.read().split()
+
+    def test_partial_rebuild(self):
+        project_dir = self.make_multi()
+        publish_dir = join(self.setting['PUBLISH_DIR'], 'multi')
+        os.makedirs(publish_dir)
+        built = self.built
+        self.assertTrue(self.builder_manager.batchrun_service('multi'))
+        self.assertEqual(built(), ['a', 'b'])
+        write_file(join(publish_dir, 'b', 'index.html'), 'stale')
+        write_file(join(project_dir, 'doc', 'a', 'page.txt'), 'a2')
+        git_commit_all(project_dir, "update a")
+        self.assertTrue(self.builder_manager.batchrun_service('multi'))
+        self.assertEqual(built(), ['a', 'b', 'a'])
+        with open(join(publish_dir, 'a', 'index.html')) as f:
+            self.assertEqual(f.read(), 'a2')
+        with open(join(publish_dir, 'b', 'index.html')) as f:
+            self.assertEqual(f.read(), 'stale')
+
+        rmtree(join(project_dir, 'doc', 'out', 'b'))
+        write_file(join(project_dir, 'doc', 'a', 'page.txt'), 'a3')
+        git_commit_all(project_dir, "update a again")
+        self.assertTrue(self.builder_manager.batchrun_service('multi'))
+        self.assertEqual(built(), ['a', 'b', 'a', 'a', 'b'])
+
+        write_file(join(project_dir, 'README'), "multi docs")
+        git_commit_all(project_dir, "update readme")
+        self.assertTrue(self.builder_manager.batchrun_service('multi'))
+        self.assertEqual(built(), ['a', 'b', 'a', 'a', 'b', 'a', 'b'])
+        with open(join(publish_dir, 'b', 'index.html')) as f:
+            self.assertEqual(f.read(), 'b')
+
+    def test_failed_build_clears_state(self):
+        project_dir = join(self.setting['DATA_DIR'], 'alpha')
+        git(project_dir, "init", "-q")
+        git_commit_all(project_dir, "initial")
+        self.assertTrue(self.builder_manager.build_service('alpha'))
+        write_file(join(project_dir, 'doc', 'Makefile'), "html:\n\tfalse\n")
+        self.assertFalse(self.builder_manager.build_service('alpha', force=True))
+        self.assertIsNone(self.builder_manager.build_state.get('alpha'))
+        self.assertFalse(self.builder_manager.build_service('alpha'))
+        self.assertNotIn('alpha', self.builder_manager.cache_hits)
+
+    def test_partial_rebuild_after_failed_publish(self):
+        project_dir = self.make_multi()
+        publish_dir = join(self.setting['PUBLISH_DIR'], 'multi')
+        self.assertFalse(self.builder_manager.batchrun_service('multi'))
+        os.makedirs(publish_dir)
+        write_file(join(project_dir, 'doc', 'a', 'page.txt'), 'a2')
+        git_commit_all(project_dir, "update a")
+        self.assertTrue(self.builder_manager.batchrun_service('multi'))
+        self.assertEqual(self.built(), ['a', 'b', 'a', 'b'])
+        self.assertEqual(sorted(os.listdir(publish_dir)), ['a', 'b'])
+
+    def test_crontab_coalesce(self):
+        with open(self.setting['DATABASE_FILE'], encoding="utf-8") as f:
+            services = json.load(f)
+        services['alpha']['synchronization'] = {"crontab": "0 * * * *"}
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        self.assertIn(' --batchrun alpha >> ', self.builder_manager.crontab_entries()[0])
+        self.setting['LOCK_COALESCE'] = True
+        self.assertIn(' --batchrun --coalesce alpha >> ', self.builder_manager.crontab_entries()[0])
+
+    def test_overlapping_batchrun(self):
+        index = join(self.setting['PUBLISH_DIR'], 'alpha', 'index.html')
+        lock = ServiceLock(join(self.setting['STATE_DIR'], 'locks'), 'alpha')
+        self.assertTrue(lock.acquire())
+        self.assertFalse(self.builder_manager.batchrun_service('alpha'))
+        self.assertFalse(lock.rerun_requested())
+        self.setting['LOCK_COALESCE'] = True
+        self.assertTrue(self.builder_manager.batchrun_service('alpha'))
+        self.assertTrue(lock.rerun_requested())
+        self.assertFalse(exists(index))
+        lock.release()
+        self.assertTrue(self.builder_manager.batchrun_service('alpha'))
+        self.assertFalse(lock.rerun_requested())
+        self.assertTrue(exists(index))
+
+
+class BuildStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_processes_merge_records(self):
+        path = join(self.root, 'state', 'build_state.json')
+        first, second = BuildState(path), BuildState(path)
+        first.set('alpha', {'head': 'a', 'recipe': 'r', 'time': 1})
+        second.set('beta', {'head': 'b', 'recipe': 'r', 'time': 2})
+        self.assertEqual(first.get('beta')['head'], 'b')
+        first.clear('alpha')
+        self.assertIsNone(second.get('alpha'))
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(list(json.load(f)), ['beta'])
+
+
+if __name__ == '__main__':
+    unittest.main()
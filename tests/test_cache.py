@@ -0,0 +1,83 @@
+import unittest
+import json
+import time
+import tempfile
+from os.path import join, exists
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from builder.cache import BuildCache
+from tests.helpers import make_setting, write_file
+
+MAKEFILE = "html:\n\techo $$DOCBUILDER_CACHE_DIR > cache_dir.txt\n\techo $$DOCTREES > doctrees.txt\n" \
+           "\ttouch $$DOCBUILDER_CACHE_DIR/environment.pickle\n"
+
+
+class BuildCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = make_setting(self.root)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_cache_environment(self):
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump({"note": {"build": ["make html"], "env": {"DOCTREES": "{cache}/doctrees"}}}, f)
+        write_file(join(self.setting['DATA_DIR'], 'note', 'Makefile'), MAKEFILE)
+        builder_manager = BuilderManager(self.setting)
+        self.assertTrue(builder_manager.build_service('note'))
+        cache_dir = join(self.setting['CACHE_DIR'], 'note')
+        with open(join(self.setting['DATA_DIR'], 'note', 'cache_dir.txt')) as f:
+            self.assertEqual(f.read().strip(), cache_dir)
+        with open(join(self.setting['DATA_DIR'], 'note', 'doctrees.txt')) as f:
+            self.assertEqual(f.read().strip(), join(cache_dir, 'doctrees'))
+        self.assertTrue(exists(join(cache_dir, 'environment.pickle')))
+        builder_manager.clear_cache('note')
+        self.assertFalse(exists(cache_dir))
+
+    def test_lru_eviction(self):
+        cache = BuildCache(self.setting['CACHE_DIR'], max_bytes=2500)
+        for name in ['old', 'middle', 'new']:
+            with cache.use(name) as cache_dir:
+                write_file(join(cache_dir, 'data'), 'x' * 1000)
+            time.sleep(0.02)
+        self.assertEqual([name for name, _, _ in cache.usage()], ['middle', 'new'])
+        with cache.use('middle'):
+            pass
+        with cache.use('newest') as cache_dir:
+            write_file(join(cache_dir, 'data'), 'x' * 1000)
+            self.assertEqual(cache.evict(), ['new'])
+        self.assertEqual(sorted(name for name, _, _ in cache.usage()), ['middle', 'newest'])
+        self.assertEqual(sorted(cache.clear()), ['middle', 'newest'])
+
+    def test_eviction_skips_cache_locked_elsewhere(self):
+        other = BuildCache(self.setting['CACHE_DIR'])
+        cache = BuildCache(self.setting['CACHE_DIR'], max_bytes=500)
+        with other.use('busy') as cache_dir:
+            write_file(join(cache_dir, 'data'), 'x' * 1000)
+            self.assertEqual(cache.evict(), [])
+            self.assertEqual(cache.clear(), [])
+            self.assertTrue(exists(join(cache_dir, 'data')))
+        self.assertEqual(cache.evict(), ['busy'])
+
+    def test_clear_stays_inside_cache(self):
+        cache = BuildCache(join(self.root, 'outer', 'cache'))
+        write_file(join(self.root, 'outer', 'precious', 'data'), 'keep')
+        with cache.use('note'):
+            pass
+        for name in ['..', '/', '../precious', 'note/..', '.']:
+            self.assertEqual(cache.clear(name), [])
+        self.assertTrue(exists(join(self.root, 'outer', 'precious', 'data')))
+        self.assertTrue(exists(join(self.root, 'outer', 'cache', 'note')))
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump({"note": {"build": []}}, f)
+        builder_manager = BuilderManager(self.setting)
+        self.assertFalse(builder_manager.clear_cache('..'))
+        self.assertTrue(builder_manager.clear_cache('note'))
+
+
+if __name__ == '__main__':
+    unittest.main()
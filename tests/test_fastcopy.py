@@ -0,0 +1,58 @@
+import unittest
+import os
+import stat
+import tempfile
+from os.path import join, exists
+from shutil import ignore_patterns, rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import copytree
+from builder.fastcopy import copy_file, fast_copytree
+from tests.helpers import write_file
+
+
+class FastCopyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.src = join(self.root, 'src')
+        self.dst = join(self.root, 'dst')
+        write_file(join(self.src, 'index.html'), 'index')
+        write_file(join(self.src, 'empty.txt'), '')
+        write_file(join(self.src, 'a', 'b', 'big.bin'), 'x' * (3 * 1024 * 1024 + 7))
+        write_file(join(self.src, 'a', 'skip.tmp'), 'tmp')
+        for i in range(200):
+            write_file(join(self.src, 'many', 'page{}.html'.format(i)), 'page {}'.format(i))
+        os.chmod(join(self.src, 'index.html'), 0o640)
+        os.utime(join(self.src, 'index.html'), ns=(1000000000, 2000000000))
+        os.utime(join(self.src, 'a'), ns=(1000000000, 3000000000))
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_copytree(self):
+        write_file(join(self.dst, 'index.html'), 'old content that is longer')
+        stats = fast_copytree(self.src, self.dst, ignore_patterns('*.tmp'), jobs=4)
+        self.assertEqual(stats['files'], 203)
+        self.assertEqual(stats['bytes'], 5 + 3 * 1024 * 1024 + 7 + sum(len('page {}'.format(i)) for i in range(200)))
+        self.assertGreater(stats['bytes_per_sec'], 0)
+        with open(join(self.dst, 'index.html')) as f:
+            self.assertEqual(f.read(), 'index')
+        st = os.stat(join(self.dst, 'index.html'))
+        self.assertEqual((stat.S_IMODE(st.st_mode), st.st_mtime_ns), (0o640, 2000000000))
+        self.assertEqual(os.stat(join(self.dst, 'a')).st_mtime_ns, 3000000000)
+        self.assertEqual(os.path.getsize(join(self.dst, 'a', 'b', 'big.bin')), 3 * 1024 * 1024 + 7)
+        self.assertTrue(exists(join(self.dst, 'empty.txt')))
+        self.assertFalse(exists(join(self.dst, 'a', 'skip.tmp')))
+        self.assertEqual(copytree(self.src, join(self.root, 'again')), stats['bytes'] + 3)
+
+    def test_fallback_copy(self):
+        methods = {'reflink': False, 'copy_file_range': False, 'sendfile': False}
+        dst_file = join(self.root, 'big.bin')
+        self.assertEqual(copy_file(join(self.src, 'a', 'b', 'big.bin'), dst_file, methods), 3 * 1024 * 1024 + 7)
+        with open(dst_file) as f:
+            self.assertEqual(f.read(), 'x' * (3 * 1024 * 1024 + 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
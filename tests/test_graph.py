@@ -0,0 +1,66 @@
+import unittest
+import threading
+import time
+import sys
+sys.path.insert(0, '..')
+from builder.graph import DependencyError, dependency_map, invalid_services, topological_order, with_dependents, \
+    run_graph
+
+
+class DependencyGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.services = {
+            "docs": {"depends_on": ["theme", "glossary"]},
+            "manual": {"depends_on": ["theme"]},
+            "theme": {},
+            "glossary": {},
+            "api": {"depends_on": ["docs"]},
+        }
+        self.deps = dependency_map(self.services)
+
+    def test_order(self):
+        order = topological_order(self.deps)
+        for name, upstreams in self.deps.items():
+            for upstream in upstreams:
+                self.assertLess(order.index(upstream), order.index(name))
+        self.assertEqual(with_dependents(self.deps, ['theme']), {'theme', 'docs', 'manual', 'api'})
+
+    def test_invalid(self):
+        self.assertRaises(DependencyError, dependency_map, {"docs": {"depends_on": ["missing"]}})
+        deps = {"a": ["b"], "b": ["a"], "c": []}
+        self.assertRaises(DependencyError, topological_order, deps)
+        services = dict(self.services, typo={"depends_on": ["missing"]}, a={"depends_on": ["b"]},
+                        b={"depends_on": ["a"]}, c={"depends_on": ["a"]})
+        self.assertEqual(sorted(invalid_services(services)), ['a', 'b', 'c', 'typo'])
+        self.assertEqual(dependency_map(services, strict=False)['typo'], [])
+
+    def test_run_parallel_and_skip(self):
+        lock = threading.Lock()
+        running, peak, finished = set(), [0], []
+
+        def run(name):
+            with lock:
+                for upstream in self.deps[name]:
+                    self.assertIn(upstream, finished)
+                running.add(name)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.1)
+            with lock:
+                running.discard(name)
+                finished.append(name)
+            return name != 'glossary', 0.1
+
+        results = run_graph(list(self.services), self.deps, run, jobs=4)
+        self.assertEqual(peak[0], 2)
+        self.assertTrue(results['theme']['success'])
+        self.assertTrue(results['manual']['success'])
+        self.assertFalse(results['glossary']['success'])
+        self.assertFalse(results['glossary']['skipped'])
+        self.assertTrue(results['docs']['skipped'])
+        self.assertTrue(results['api']['skipped'])
+        self.assertNotIn('docs', finished)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import json
+import time
+import tempfile
+from os.path import join
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from builder.jobserver import JobServer
+from builder.registry import validate_service
+from tests.helpers import make_setting, write_file
+
+MAKEFILE = "html:\n\techo \"$$MAKEFLAGS\" > makeflags.txt\n\tnice > nice.txt\n\tulimit -t > cpu.txt\n\tulimit -v > memory.txt\n"
+SLEEP_MAKEFILE = "html: t1 t2 t3 t4\nt%:\n\tsleep 0.3\n"
+
+
+class JobServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = make_setting(self.root)
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump({"note": {"build": ["make html"], "limits": {"nice": 5, "cpu": 600, "memory": 2 ** 30}}}, f)
+        write_file(join(self.setting['DATA_DIR'], 'note', 'Makefile'), MAKEFILE)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def read(self, name):
+        with open(join(self.setting['DATA_DIR'], 'note', name), encoding="utf-8") as f:
+            return f.read().strip()
+
+    def test_shared_jobserver_and_limits(self):
+        self.setting['MAKE_JOBSERVER'] = True
+        self.setting['JOBSERVER_SLOTS'] = 4
+        builder_manager = BuilderManager(self.setting)
+        self.assertTrue(builder_manager.build_service('note'))
+        self.assertIn("--jobserver-auth=", self.read('makeflags.txt'))
+        self.assertEqual(int(self.read('nice.txt')), os.nice(0) + 5)
+        self.assertEqual(self.read('cpu.txt'), '600')
+        self.assertEqual(self.read('memory.txt'), str(2 ** 20))
+        os.set_blocking(builder_manager.jobserver.read_fd, False)
+        self.assertEqual(len(os.read(builder_manager.jobserver.read_fd, 64)), 4)
+        builder_manager.jobserver.close()
+
+    def test_slots_bound_concurrent_builds(self):
+        services = {}
+        for name in ['alpha', 'beta', 'gamma']:
+            services[name] = {"build": ["make html"]}
+            write_file(join(self.setting['DATA_DIR'], name, 'Makefile'), SLEEP_MAKEFILE)
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        self.setting['MAKE_JOBSERVER'] = True
+        self.setting['JOBSERVER_SLOTS'] = 2
+        builder_manager = BuilderManager(self.setting)
+        start = time.monotonic()
+        summary = builder_manager.batchrun_all(jobs=3)
+        self.assertTrue(all(result['success'] for result in summary.values()))
+        # 12 jobs of 0.3s on 2 slots
+        self.assertGreaterEqual(time.monotonic() - start, 1.8)
+        builder_manager.jobserver.close()
+
+    def test_refill_after_lost_tokens(self):
+        jobserver = JobServer(3)
+        token = jobserver.acquire()
+        os.read(jobserver.read_fd, 2)
+        jobserver.release(token)
+        os.set_blocking(jobserver.read_fd, False)
+        self.assertEqual(os.read(jobserver.read_fd, 64), b'+++')
+        os.set_blocking(jobserver.read_fd, True)
+        jobserver.close()
+
+    def test_validate_limits(self):
+        self.assertIsNone(validate_service('note', {"build": [], "limits": {"cpu": 600, "memory": 2 ** 30}}))
+        self.assertIsNotNone(validate_service('note', {"build": [], "limits": {"disk": 1}}))
+        self.assertIsNotNone(validate_service('note', {"build": [], "limits": {"cpu": "10m"}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
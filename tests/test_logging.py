@@ -0,0 +1,81 @@
+import unittest
+import json
+import logging
+import tempfile
+from logging.handlers import QueueHandler
+from os.path import join, exists
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from builder.minisetting import Setting
+from builder.utils import ServiceFileHandler, config_logging, log_context
+
+
+def disable_logging():
+    setting = Setting()
+    setting['LOG_ENABLED'] = False
+    config_logging(setting)
+
+
+class LoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = Setting()
+        self.setting['LOG_DIR'] = self.root
+        self.setting['LOG_FILE'] = 'docbuilder.log'
+        self.setting['LOG_JSON'] = True
+        self.setting['LOG_SERVICE_FILES'] = True
+        self.setting['DATABASE_FILE'] = join(self.root, 'database.json')
+        self.setting['STATE_DIR'] = join(self.root, 'state')
+
+    def tearDown(self):
+        disable_logging()
+        rmtree(self.root)
+
+    def read_records(self, path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_single_handler_set(self):
+        BuilderManager(self.setting)
+        BuilderManager(self.setting)
+        queue_handlers = [handler for handler in logging.getLogger().handlers if isinstance(handler, QueueHandler)]
+        self.assertEqual(len(queue_handlers), 1)
+
+        logger = logging.getLogger('LoggingTest')
+        with log_context('note', 'build'):
+            logger.info("building", extra={'duration': 1.5})
+        logger.info("global")
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            logger.exception("failed")
+        disable_logging()
+
+        records = self.read_records(join(self.root, 'docbuilder.log'))
+        self.assertEqual([record['message'] for record in records], ['building', 'global', 'failed'])
+        self.assertIn("ValueError: broken", records[2]['exception'])
+        self.assertNotIn('exception', records[1])
+        self.assertEqual((records[0]['service'], records[0]['phase'], records[0]['duration']), ('note', 'build', 1.5))
+        self.assertNotIn('service', records[1])
+        records = self.read_records(join(self.root, 'services', 'note.log'))
+        self.assertEqual([record['message'] for record in records], ['building'])
+        self.assertFalse(exists(join(self.root, 'services', 'None.log')))
+
+    def test_service_files_bounded(self):
+        handler = ServiceFileHandler(join(self.root, 'services'), max_open=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for service in ['alpha', 'beta', 'alpha', 'gamma', 'beta']:
+            record = logging.LogRecord('test', logging.INFO, __file__, 1, service, None, None)
+            record.service = service
+            handler.emit(record)
+        self.assertEqual(list(handler._handlers), ['gamma', 'beta'])
+        handler.close()
+        with open(join(self.root, 'services', 'beta.log'), encoding="utf-8") as f:
+            self.assertEqual(f.read().split(), ['beta', 'beta'])
+
+
+if __name__ == '__main__':
+    unittest.main()
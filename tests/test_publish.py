@@ -0,0 +1,216 @@
+import unittest
+import os
+import json
+import gzip
+import tempfile
+from os.path import join, exists
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from builder.compress import compress_tree
+from tests.helpers import make_setting, write_file
+
+
+class PublishTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = make_setting(self.root)
+        self.setting['PUBLISH_MODE'] = 'delta'
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump({"site": {"build": [], "publish": "./out"}}, f)
+        self.out_dir = join(self.setting['DATA_DIR'], 'site', 'out')
+        self.publish_dir = join(self.setting['PUBLISH_DIR'], 'site')
+        os.makedirs(self.publish_dir)
+        write_file(join(self.out_dir, 'index.html'), 'index')
+        write_file(join(self.out_dir, 'a', 'page.html'), 'page')
+        write_file(join(self.out_dir, 'b', 'old.html'), 'old')
+        self.builder_manager = BuilderManager(self.setting)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+
+class DeltaPublishTest(PublishTestCase):
+
+    def test_delta_publish(self):
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertTrue(exists(join(self.publish_dir, 'a', 'page.html')))
+        self.assertTrue(exists(join(self.setting['STATE_DIR'], 'manifests', 'site.json')))
+
+        write_file(join(self.out_dir, 'index.html'), 'index changed')
+        os.remove(join(self.out_dir, 'b', 'old.html'))
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        with open(join(self.publish_dir, 'index.html'), encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'index changed')
+        self.assertFalse(exists(join(self.publish_dir, 'b', 'old.html')))
+        self.assertFalse(exists(join(self.publish_dir, 'b')))
+        self.assertTrue(exists(join(self.publish_dir, 'a', 'page.html')))
+
+    def test_delta_publish_type_change(self):
+        write_file(join(self.out_dir, 'api'), 'api file')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        os.remove(join(self.out_dir, 'api'))
+        write_file(join(self.out_dir, 'api', 'index.html'), 'api dir')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        with open(join(self.publish_dir, 'api', 'index.html'), encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'api dir')
+
+        write_file(join(self.publish_dir, 'api', 'unmanaged.html'), 'unmanaged')
+        rmtree(join(self.out_dir, 'api'))
+        write_file(join(self.out_dir, 'api'), 'api file again')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        with open(join(self.publish_dir, 'api'), encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'api file again')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+
+    def test_delta_publish_outputs(self):
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        write_file(join(self.out_dir, 'index.html'), 'index changed')
+        write_file(join(self.out_dir, 'a', 'page.html'), 'page changed')
+        os.remove(join(self.out_dir, 'b', 'old.html'))
+        self.builder_manager.partial_outputs['site'] = ['a']
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        with open(join(self.publish_dir, 'a', 'page.html'), encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'page changed')
+        with open(join(self.publish_dir, 'index.html'), encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'index')
+        self.assertTrue(exists(join(self.publish_dir, 'b', 'old.html')))
+
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertFalse(exists(join(self.publish_dir, 'b', 'old.html')))
+
+
+class ReleasePublishTest(PublishTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.setting['PUBLISH_MODE'] = 'release'
+        self.setting['RELEASE_KEEP'] = 3
+        self.release_root = join(self.root, 'share-releases', 'site')
+
+    def read_live(self, name):
+        with open(join(self.publish_dir, name), encoding="utf-8") as f:
+            return f.read()
+
+    def test_release_publish_and_rollback(self):
+        write_file(join(self.publish_dir, 'legacy.html'), 'legacy')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertTrue(os.path.islink(self.publish_dir))
+        self.assertFalse(exists(join(self.publish_dir, 'legacy.html')))
+        first = os.path.realpath(self.publish_dir)
+
+        write_file(join(self.out_dir, 'index.html'), 'index changed')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        second = os.path.realpath(self.publish_dir)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.read_live('index.html'), 'index changed')
+        self.assertEqual(os.stat(join(first, 'a', 'page.html')).st_ino,
+                         os.stat(join(second, 'a', 'page.html')).st_ino)
+        self.assertEqual(len(os.listdir(self.release_root)), 3)
+
+        self.assertTrue(self.builder_manager.rollback_service('site'))
+        self.assertEqual(self.read_live('index.html'), 'index')
+        self.assertTrue(self.builder_manager.rollback_service('site'))
+        self.assertTrue(exists(join(self.publish_dir, 'legacy.html')))
+        self.assertFalse(self.builder_manager.rollback_service('site'))
+
+        self.setting['RELEASE_KEEP'] = 1
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertEqual(os.listdir(self.release_root), [os.path.basename(os.path.realpath(self.publish_dir))])
+
+        self.setting['PUBLISH_MODE'] = 'delta'
+        self.assertFalse(self.builder_manager.publish_service('site'))
+
+    def test_release_publish_failure_keeps_live_dir(self):
+        write_file(join(self.root, 'not-a-dir'), '')
+        self.setting['PUBLISH_MODE'] = 'release'
+        self.setting['RELEASE_DIR'] = join(self.root, 'not-a-dir', 'releases')
+        self.assertFalse(self.builder_manager.publish_service('site'))
+        self.assertEqual(os.listdir(self.publish_dir), [])
+        write_file(join(self.publish_dir, 'legacy.html'), 'legacy')
+        self.assertFalse(self.builder_manager.publish_service('site'))
+        self.assertEqual(os.listdir(self.publish_dir), ['legacy.html'])
+        self.setting['RELEASE_DIR'] = None
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertEqual(self.read_live('index.html'), 'index')
+
+
+class CompressTest(PublishTestCase):
+
+    def test_compress_tree(self):
+        root = join(self.root, 'site')
+        state_file = join(self.setting['STATE_DIR'], 'compressed', 'site.json')
+        for i in range(6):
+            write_file(join(root, 'page{}.html'.format(i)), 'content ' * 300)
+        write_file(join(root, 'small.css'), 'a{}')
+        write_file(join(root, 'image.png'), 'x' * 4000)
+        write_file(join(root, 'sitemap.xml.gz'), 'shipped')
+        write_file(join(root, 'feed.xml'), 'x' * 4000)
+        write_file(join(root, 'feed.xml.gz'), 'shipped')
+        write_file(join(root, 'archive.tar.gz'), 'x' * 4000)
+        stats = compress_tree(root, self.setting['COMPRESS_EXTENSIONS'], min_size=1024, jobs=2,
+                              state_file=state_file)
+        self.assertEqual((stats['compressed'], stats['removed']), (6, 0))
+        self.assertTrue(exists(join(root, 'page0.html.gz')))
+        self.assertFalse(exists(join(root, 'small.css.gz')))
+        self.assertFalse(exists(join(root, 'image.png.gz')))
+        self.assertTrue(exists(join(root, 'sitemap.xml.gz')))
+        self.assertTrue(exists(join(root, 'archive.tar.gz')))
+        with open(join(root, 'feed.xml.gz')) as f:
+            self.assertEqual(f.read(), 'shipped')
+        with gzip.open(join(root, 'page0.html.gz'), 'rt') as f:
+            self.assertEqual(f.read(), 'content ' * 300)
+
+        write_file(join(root, 'page1.html'), 'changed ' * 300)
+        os.remove(join(root, 'page2.html'))
+        os.remove(join(root, 'feed.xml'))
+        stats = compress_tree(root, self.setting['COMPRESS_EXTENSIONS'], min_size=1024, jobs=2,
+                              state_file=state_file)
+        self.assertEqual((stats['compressed'], stats['skipped'], stats['removed']), (1, 4, 1))
+        self.assertFalse(exists(join(root, 'page2.html.gz')))
+        self.assertTrue(exists(join(root, 'feed.xml.gz')))
+        self.assertTrue(exists(join(root, 'sitemap.xml.gz')))
+
+    def test_compress_release_publish(self):
+        self.setting['PUBLISH_MODE'] = 'release'
+        self.setting['COMPRESS_ENABLED'] = True
+        self.setting['COMPRESS_MIN_SIZE'] = 0
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        first = os.path.realpath(self.publish_dir)
+        self.assertTrue(exists(join(self.publish_dir, 'a', 'page.html.gz')))
+        write_file(join(self.out_dir, 'index.html'), 'index changed')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertEqual(os.stat(join(first, 'a', 'page.html.gz')).st_ino,
+                         os.stat(join(self.publish_dir, 'a', 'page.html.gz')).st_ino)
+        with gzip.open(join(self.publish_dir, 'index.html.gz'), 'rt') as f:
+            self.assertEqual(f.read(), 'index changed')
+
+
+class SearchIndexTest(PublishTestCase):
+
+    def test_incremental_index(self):
+        self.setting['SEARCH_ENABLED'] = True
+        write_file(join(self.out_dir, 'index.html'),
+                   '<html><head><title>Bitbake Guide</title><script>var hidden;</script></head>'
+                   '<body><p>Recipes are parsed by bitbake.</p></body></html>')
+        write_file(join(self.out_dir, 'a', 'page.html'), '<title>Kernel</title><p>Configure the kernel</p>')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        results = self.builder_manager.search('bitbake recipes')
+        self.assertEqual([(service, path, title) for service, path, title, _ in results],
+                         [('site', 'index.html', 'Bitbake Guide')])
+        self.assertEqual(self.builder_manager.search('hidden'), [])
+        self.assertEqual(len(self.builder_manager.search('kernel')), 1)
+
+        os.remove(join(self.out_dir, 'a', 'page.html'))
+        write_file(join(self.out_dir, 'b', 'old.html'), '<p>Toaster "manual"</p>')
+        self.assertTrue(self.builder_manager.publish_service('site'))
+        self.assertEqual(self.builder_manager.search('kernel'), [])
+        self.assertEqual(len(self.builder_manager.search('"manual')), 1)
+        stats = self.builder_manager.search_index.update_service('site', self.publish_dir)
+        self.assertEqual(stats, {'indexed': 0, 'unchanged': 2, 'removed': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+from os.path import join
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder.registry import ServiceRegistry, save_services
+
+
+class ServiceRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.services = {
+            "note": {"source": "a.git", "build": ["make html"], "publish": "./_build/html"},
+            "static": {"publish": "./site"},
+            "bad": {"build": "make html"},
+            "test": {}
+        }
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def check_registry(self, registry):
+        self.assertEqual(registry.build_services(), ['note'])
+        self.assertEqual(registry.publish_services(), ['note', 'static'])
+        self.assertTrue(registry.is_publish_service('static'))
+        self.assertFalse(registry.is_build_service('static'))
+        self.assertIsNone(registry.get('bad'))
+        self.assertEqual(registry.get('note')['publish'], './_build/html')
+
+    def test_json_reload_on_change(self):
+        path = join(self.root, 'database.json')
+        registry = ServiceRegistry(path)
+        self.assertEqual(registry.build_services(), [])
+        save_services(path, self.services)
+        self.check_registry(registry)
+        version = registry.version
+        registry.services()
+        self.assertEqual(registry.version, version)
+
+        self.services['other'] = {"source": "b.git", "build": ["make"]}
+        save_services(path, self.services)
+        self.assertEqual(registry.build_services(), ['note', 'other'])
+        self.assertEqual(registry.version, version + 1)
+
+    def test_sqlite_store(self):
+        path = join(self.root, 'database.db')
+        save_services(path, self.services)
+        self.check_registry(ServiceRegistry(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
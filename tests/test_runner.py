@@ -0,0 +1,80 @@
+import unittest
+import io
+import os
+import tempfile
+import time
+from os.path import join, exists, getsize
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder.runner import BuildLog, iter_output, run_command
+
+
+class RunCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.log_path = join(self.root, 'build', 'service.log')
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_stream_stdout_and_stderr(self):
+        with BuildLog(self.log_path, tail_lines=2) as build_log:
+            ret = run_command(["sh", "-c", "echo one; echo two >&2; echo three; exit 3"], self.root, build_log)
+            self.assertEqual(ret.returncode, 3)
+            self.assertFalse(ret.success)
+            self.assertEqual(build_log.tail(), "two\nthree")
+        with open(self.log_path, encoding="utf-8") as f:
+            content = f.read()
+        self.assertIn("one\ntwo\nthree\n", content)
+
+    def test_timeout_kills_process_group(self):
+        marker = join(self.root, 'marker')
+        with BuildLog(self.log_path) as build_log:
+            start = time.monotonic()
+            ret = run_command(["sh", "-c", "(sleep 2; touch {}) & sleep 10".format(marker)],
+                              self.root, build_log, timeout=0.3)
+            self.assertTrue(ret.timed_out)
+            self.assertLess(time.monotonic() - start, 5)
+        time.sleep(2.2)
+        self.assertFalse(exists(marker))
+
+    def test_failed_log_write_kills_process_group(self):
+        class FullLog(BuildLog):
+            def write(self, line):
+                if not line.startswith(b'['):
+                    raise OSError(28, 'No space left on device')
+                super().write(line)
+
+        start = time.monotonic()
+        with FullLog(self.log_path) as build_log:
+            with self.assertRaises(OSError):
+                run_command(["sh", "-c", "echo $$ > pid; echo start; sleep 30"], self.root, build_log)
+        self.assertLess(time.monotonic() - start, 10)
+        with open(join(self.root, 'pid')) as f:
+            pid = int(f.read())
+        with self.assertRaises(ProcessLookupError):
+            os.killpg(pid, 0)
+
+    def test_bounded_output_chunks(self):
+        data = b"progress 1%\rprogress 50%\rdone\r\n" + b"x" * 300 + b"\nend"
+        pieces = list(iter_output(io.BufferedReader(io.BytesIO(data), buffer_size=7), chunk_size=100))
+        self.assertEqual(b''.join(pieces), data)
+        self.assertLessEqual(max(len(piece) for piece in pieces), 100)
+        self.assertEqual(pieces[:3], [b"progress 1%\r", b"progress 50%\r", b"done\r\n"])
+        with BuildLog(self.log_path, tail_lines=3) as build_log:
+            run_command(["sh", "-c", "printf 'a\\rb\\rc'"], self.root, build_log)
+            self.assertEqual(build_log.tail(), "a\nb\nc")
+
+    def test_rotation(self):
+        with BuildLog(self.log_path, max_bytes=1000, backup_count=2) as build_log:
+            run_command(["sh", "-c", "for i in $(seq 1 500); do echo line $i; done"], self.root, build_log)
+        self.assertLessEqual(getsize(self.log_path), 1000)
+        self.assertTrue(exists(self.log_path + '.1'))
+        self.assertTrue(exists(self.log_path + '.2'))
+        self.assertFalse(exists(self.log_path + '.3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import asyncio
+import datetime
+import json
+import tempfile
+import threading
+from os.path import join
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder.minisetting import Setting
+from builder.registry import ServiceRegistry
+from builder.scheduler import CronExpression, Scheduler, spread_cron
+
+
+class FakeManager:
+    def __init__(self, setting):
+        self.setting = setting
+        self.registry = ServiceRegistry(setting['DATABASE_FILE'])
+        self.release = threading.Event()
+        self.runs = []
+
+    def batchrun_service(self, service_name):
+        self.runs.append(service_name)
+        self.release.wait(5)
+        return True
+
+
+class CronExpressionTest(unittest.TestCase):
+
+    def test_matches(self):
+        cron = CronExpression('*/15 9-17 * * 1-5')
+        self.assertTrue(cron.matches(datetime.datetime(2020, 6, 1, 9, 30)))  # Monday
+        self.assertFalse(cron.matches(datetime.datetime(2020, 6, 1, 9, 31)))
+        self.assertFalse(cron.matches(datetime.datetime(2020, 6, 1, 18, 0)))
+        self.assertFalse(cron.matches(datetime.datetime(2020, 6, 7, 9, 30)))  # Sunday
+        self.assertTrue(CronExpression('@daily').matches(datetime.datetime(2020, 6, 7, 0, 0)))
+        self.assertTrue(CronExpression('0 0 1 * 7').matches(datetime.datetime(2020, 6, 7, 0, 0)))
+        step_days = CronExpression('0 0 */2 * 1')
+        self.assertTrue(step_days.matches(datetime.datetime(2020, 6, 1, 0, 0)))
+        self.assertFalse(step_days.matches(datetime.datetime(2020, 6, 7, 0, 0)))
+        self.assertFalse(step_days.matches(datetime.datetime(2020, 6, 8, 0, 0)))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, CronExpression, '* * *')
+        self.assertRaises(ValueError, CronExpression, '60 * * * *')
+
+    def test_spread(self):
+        self.assertEqual(spread_cron('0 * * * *', 'alpha'), spread_cron('0 * * * *', 'alpha'))
+        minutes = {spread_cron('0 * * * *', name).split()[0] for name in ['alpha', 'beta', 'gamma', 'delta']}
+        self.assertGreater(len(minutes), 1)
+        self.assertTrue(spread_cron('0 9 * * 1-5', 'alpha').endswith(' 9 * * 1-5'))
+        spread = spread_cron('*/15 * * * *', 'alpha')
+        self.assertEqual(len(CronExpression(spread).minutes), 4)
+        self.assertLess(min(CronExpression(spread).minutes), 15)
+        daily = CronExpression(spread_cron('@daily', 'alpha'))
+        self.assertEqual((len(daily.minutes), len(daily.hours)), (1, 1))
+        self.assertEqual(spread_cron('5,35 * * * *', 'alpha'), '5,35 * * * *')
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = Setting()
+        self.setting['DATABASE_FILE'] = join(self.root, 'database.json')
+        services = {name: {"build": [], "synchronization": {"crontab": "* * * * *"}}
+                    for name in ['alpha', 'beta', 'gamma']}
+        services['manual'] = {"build": []}
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+        self.manager = FakeManager(self.setting)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_no_overlap_and_concurrency_limit(self):
+        async def scenario():
+            scheduler = Scheduler(self.manager, jobs=2)
+            now = datetime.datetime(2020, 6, 1, 9, 30)
+            self.assertEqual(scheduler.tick(now), ['alpha', 'beta', 'gamma'])
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(self.manager.runs), 2)
+            self.assertEqual(scheduler.tick(now + datetime.timedelta(minutes=1)), [])
+            self.manager.release.set()
+            await asyncio.wait(scheduler.tasks)
+            self.assertEqual(sorted(self.manager.runs), ['alpha', 'beta', 'gamma'])
+            self.assertEqual(scheduler.tick(now + datetime.timedelta(minutes=1, seconds=30)), [])
+            self.assertEqual(scheduler.tick(now + datetime.timedelta(minutes=2)), ['alpha', 'beta', 'gamma'])
+            await asyncio.wait(scheduler.tasks)
+            scheduler._executor.shutdown()
+
+        asyncio.run(scenario())
+
+    def test_keep_schedule_on_broken_database(self):
+        async def scenario():
+            scheduler = Scheduler(self.manager, jobs=2)
+            self.manager.release.set()
+            now = datetime.datetime(2020, 6, 1, 9, 30)
+            self.assertEqual(scheduler.tick(now), ['alpha', 'beta', 'gamma'])
+            await asyncio.wait(scheduler.tasks)
+            with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+                f.write('{"alpha": {"build": [')
+            self.assertEqual(scheduler.tick(now + datetime.timedelta(minutes=1)), ['alpha', 'beta', 'gamma'])
+            await asyncio.wait(scheduler.tasks)
+            scheduler._executor.shutdown()
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import json
+import tempfile
+from os.path import join, exists
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder import BuilderManager
+from tests.helpers import git, git_commit_all, make_setting, write_file
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.setting = make_setting(self.root)
+        services = {}
+        self.work_dirs = {}
+        for name in ['alpha', 'beta']:
+            remote = join(self.root, 'remotes', name + '.git')
+            os.makedirs(remote)
+            git(remote, "init", "-q", "--bare")
+            work_dir = join(self.root, 'work', name)
+            git(self.root, "clone", "-q", remote, work_dir)
+            write_file(join(work_dir, 'index.rst'), name)
+            git_commit_all(work_dir, "initial")
+            git(work_dir, "push", "-q", "origin", "HEAD")
+            self.work_dirs[name] = work_dir
+            services[name] = {"source": remote, "build": ["make html"], "publish": "./_build/html"}
+        with open(self.setting['DATABASE_FILE'], 'w', encoding="utf-8") as f:
+            json.dump(services, f)
+
+    def tearDown(self):
+        rmtree(self.root)
+
+    def test_init_and_update(self):
+        self.setting['GIT_MIRROR_DIR'] = join(self.root, 'mirrors')
+        builder_manager = BuilderManager(self.setting)
+        trace = join(self.root, 'git_trace')
+        os.environ['GIT_TRACE'] = trace
+        try:
+            builder_manager.init()
+        finally:
+            del os.environ['GIT_TRACE']
+        for name in ['alpha', 'beta']:
+            self.assertTrue(exists(join(self.setting['DATA_DIR'], name, 'index.rst')))
+            self.assertTrue(exists(join(self.setting['PUBLISH_DIR'], name)))
+            self.assertTrue(exists(join(self.root, 'mirrors', name + '.git')))
+            # objects were borrowed from the mirror, then copied in by --dissociate
+            self.assertFalse(exists(join(self.setting['DATA_DIR'], name, '.git', 'objects', 'info', 'alternates')))
+        with open(trace, encoding="utf-8") as f:
+            self.assertEqual(f.read().count("run_command: git repack -a -d"), 2)
+
+        write_file(join(self.work_dirs['alpha'], 'page.rst'), 'page')
+        head = git_commit_all(self.work_dirs['alpha'], "add page")
+        git(self.work_dirs['alpha'], "push", "-q", "origin", "HEAD")
+        results = builder_manager.sync_services(jobs=2)
+        self.assertEqual(results, {'alpha': True, 'beta': True})
+        checkout = join(self.setting['DATA_DIR'], 'alpha')
+        self.assertTrue(exists(join(checkout, 'page.rst')))
+        self.assertEqual(git(checkout, "rev-parse", "HEAD"), head)
+
+    def test_partial_clone(self):
+        self.setting['GIT_CLONE_FILTER'] = 'blob:none'
+        builder_manager = BuilderManager(self.setting)
+        self.assertTrue(builder_manager.sync_service('beta'))
+        self.assertTrue(exists(join(self.setting['DATA_DIR'], 'beta', 'index.rst')))
+
+    def test_sync_failure(self):
+        rmtree(join(self.root, 'remotes', 'beta.git'))
+        builder_manager = BuilderManager(self.setting)
+        self.assertRaises(RuntimeError, builder_manager.init)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import json
+import tempfile
+import threading
+import time
+import urllib.request
+import urllib.error
+from os.path import join
+from shutil import rmtree
+import sys
+sys.path.insert(0, '..')
+from builder.registry import ServiceRegistry, save_services
+from builder.trigger import TriggerQueue, TriggerServer
+
+
+class TriggerQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.runs = []
+
+    def run_service(self, service_name):
+        self.runs.append(service_name)
+        self.started.set()
+        self.release.wait(5)
+
+    def test_coalescing(self):
+        queue = TriggerQueue(self.run_service)
+        self.assertEqual(queue.trigger('note'), 'queued')
+        self.assertEqual(queue.trigger('note'), 'coalesced')
+        self.assertEqual(queue.trigger('other'), 'queued')
+        self.assertEqual(queue.status()['queue_depth'], 2)
+        queue.start()
+        self.assertTrue(self.started.wait(5))
+        self.assertIn('note', queue.status()['running'])
+        self.assertEqual(queue.trigger('note'), 'follow-up')
+        self.assertEqual(queue.trigger('note'), 'coalesced')
+        self.assertEqual(queue.status()['queue_depth'], 2)
+        self.release.set()
+        for _ in range(100):
+            if len(self.runs) == 3 and not queue.status()['running']:
+                break
+            time.sleep(0.05)
+        queue.stop()
+        self.assertEqual(self.runs, ['note', 'other', 'note'])
+
+
+class TriggerServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        database_file = join(self.root, 'database.json')
+        save_services(database_file, {"note": {"build": []}})
+        self.queue = TriggerQueue(lambda service_name: None)
+        self.server = TriggerServer(('127.0.0.1', 0), self.queue, ServiceRegistry(database_file))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        rmtree(self.root)
+
+    def request(self, path, method='GET'):
+        req = urllib.request.Request(self.url + path, method=method, data=b'' if method == 'POST' else None)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read().decode('utf-8'))
+
+    def test_endpoints(self):
+        self.assertEqual(self.request('/rebuild/note', 'POST'), (202, {'service': 'note', 'result': 'queued'}))
+        self.assertEqual(self.request('/rebuild/note', 'POST')[1]['result'], 'coalesced')
+        self.assertEqual(self.request('/rebuild/missing', 'POST')[0], 404)
+        status, body = self.request('/status')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['pending'], ['note'])
+
+
+if __name__ == '__main__':
+    unittest.main()